@@ -1,14 +1,16 @@
-from typing import List, Dict, Any, Generator
+import copy
+from typing import List, Dict, Any, AsyncGenerator, Generator
 
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import AIMessage, HumanMessage
 from langchain.tools.retriever import create_retriever_tool
 
+from core.history import ChatHistoryWindow
 from core.llm import get_llm
-from core.vectorstore import create_or_load_vectorstore
+from core.telemetry import get_callback_handler
+from core.vectorstore import create_or_load_scenario_vectorstore
 from core.embeddings import get_embedding_model
-from utils.file_io import load_documents_from_directories
+from config.settings import AGENT_VERBOSE
 from platform_logic.scenario_loader import Scenario
 from tools.web_search import get_web_search_tool
 from tools.url_parser import get_url_parser_tool
@@ -17,23 +19,28 @@ class SecurityAgent:
     def __init__(self, scenario: Scenario):
         self.scenario = scenario
         self.chat_history = []
+        self.history_window = ChatHistoryWindow()
         
         self.embeddings = get_embedding_model()
         self.llm = get_llm()
         
         # --- Retriever Setup ---
-        docs = load_documents_from_directories(scenario.initial_state.files)
-        self.vector_store = create_or_load_vectorstore(docs, self.embeddings, scenario.user_role)
-        retriever = self.vector_store.as_retriever()
+        # The scenario's own files, in a store of their own.
+        self.vector_store = create_or_load_scenario_vectorstore(
+            scenario.id, scenario.initial_state.files, self.embeddings
+        )
         
         # --- Tools Setup ---
         self.tools = []
-        retriever_tool = create_retriever_tool(
-            retriever,
-            "innovatex_document_search",
-            "Searches and returns information from InnovateX's internal corporate documents. Use this for any questions about company policies, projects, financials, or internal communications."
-        )
-        self.tools.append(retriever_tool)
+        if self.vector_store is not None:
+            retriever_tool = create_retriever_tool(
+                self.vector_store.as_retriever(),
+                "innovatex_document_search",
+                "Searches and returns information from InnovateX's internal corporate documents. Use this for any questions about company policies, projects, financials, or internal communications."
+            )
+            self.tools.append(retriever_tool)
+        else:
+            print(f"Warning: document search is unavailable for scenario '{scenario.id}'.")
         
         # Add the URL parser tool unconditionally
         self.tools.append(get_url_parser_tool())
@@ -45,6 +52,16 @@ class SecurityAgent:
         
         self._setup_agent_executor()
 
+    def fork(self, chat_history: List[Dict[str, str]]) -> "SecurityAgent":
+        """
+        Returns a lightweight copy of this agent for one session. The models,
+        retriever, tools and executor are shared; the chat history is not.
+        """
+        agent = copy.copy(self)
+        agent.chat_history = list(chat_history)
+        agent.history_window = ChatHistoryWindow()
+        return agent
+
     def _setup_agent_executor(self):
         """
         Sets up the LangChain AgentExecutor with the available tools.
@@ -75,20 +92,17 @@ Think step-by-step and choose the correct tool based on the rules above.
         ])
         
         agent = create_tool_calling_agent(self.llm, self.tools, prompt)
-        self.agent_executor = AgentExecutor(agent=agent, tools=self.tools, verbose=True)
+        self.agent_executor = AgentExecutor(agent=agent, tools=self.tools, verbose=AGENT_VERBOSE)
 
     def ask(self, question: str) -> Generator[Dict[str, Any], None, None]:
-        langchain_chat_history = []
-        for message in self.chat_history:
-            if message["role"] == "user":
-                langchain_chat_history.append(HumanMessage(content=message["content"]))
-            elif message["role"] == "assistant":
-                langchain_chat_history.append(AIMessage(content=message["content"]))
+        # Only the recent turns that fit the history token budget are sent.
+        langchain_chat_history = self.history_window.window(self.chat_history).messages
 
+        # The telemetry handler is passed per run so tool calls inherit it.
         stream = self.agent_executor.stream({
             "input": question,
             "chat_history": langchain_chat_history
-        })
+        }, config={"callbacks": [get_callback_handler()]})
         
         full_answer = ""
         for chunk in stream:
@@ -101,3 +115,19 @@ Think step-by-step and choose the correct tool based on the rules above.
 
         self.chat_history.append({"role": "user", "content": question})
         self.chat_history.append({"role": "assistant", "content": full_answer})
+
+    async def aask(self, question: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """Async variant of ask, streaming the agent's chunks with astream."""
+        langchain_chat_history = self.history_window.window(self.chat_history).messages
+
+        full_answer = ""
+        async for chunk in self.agent_executor.astream({
+            "input": question,
+            "chat_history": langchain_chat_history
+        }, config={"callbacks": [get_callback_handler()]}):
+            if "output" in chunk:
+                full_answer += chunk["output"]
+            yield chunk
+
+        self.chat_history.append({"role": "user", "content": question})
+        self.chat_history.append({"role": "assistant", "content": full_answer})
@@ -1,18 +1,16 @@
 import streamlit as st
 import os
-from core.access_control import authenticate_user, load_users
+from core.access_control import issue_session_token, list_users, verify_session_token
+from core.answer_cache import SemanticAnswerCache
 from core.embeddings import get_embedding_model
-from core.retrieval import run_rag_pipeline
-
-# Initialize embedding model once
-@st.cache_resource
-def initialize_embeddings():
-    return get_embedding_model()
+from core.retrieval import DoneEvent, RetrievalEvent, TokenEvent, get_rag_pipeline
+from utils.interaction_log import (log_event, log_interaction, new_request_id,
+                                   setup_interaction_logging)
 
 def login_page():
     st.title("RAG System Login")
     
-    users_data = load_users()
+    users_data = list_users()
     usernames = [user.username for user in users_data]
 
     selected_username = st.selectbox("Select User", usernames)
@@ -20,7 +18,9 @@ def login_page():
     if st.button("Login as Selected User"):
         selected_user = next((user for user in users_data if user.username == selected_username), None)
         if selected_user:
-            st.session_state["user"] = selected_user
+            # Reruns re-check this signed token instead of the credentials.
+            st.session_state["auth_token"] = issue_session_token(selected_user)
+            log_event("auth.login", channel="streamlit", user=selected_user.username, role=selected_user.role)
             st.rerun()
         else:
             st.error("User not found.")
@@ -39,34 +39,43 @@ def chat_page():
             st.markdown(message["content"])
 
     if prompt := st.chat_input("Ask a question"):
+        # Earlier turns only; the new question is passed separately.
+        chat_history = list(st.session_state.messages)
         st.session_state.messages.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
             
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
-                embeddings = initialize_embeddings()
-                if embeddings:
+                embeddings = get_embedding_model()
+                pipeline = get_rag_pipeline(user, embeddings) if embeddings else None
+                if pipeline:
+                    if "answer_cache" not in st.session_state:
+                        st.session_state.answer_cache = SemanticAnswerCache(embeddings)
+                    if "history_window" not in st.session_state:
+                        st.session_state.history_window = pipeline.new_history_window()
                     
+                    # One pipeline execution yields both the answer tokens and
+                    # the retrieved documents used for the sources list.
+                    sources = []
+                    request_id = new_request_id()
+
                     def stream_answer():
-                        stream = run_rag_pipeline(user, prompt, embeddings, st.session_state.messages)
-                        for chunk in stream:
-                            if "answer" in chunk:
-                                yield chunk["answer"]
+                        events = pipeline.stream_events(
+                            prompt, chat_history,
+                            answer_cache=st.session_state.answer_cache,
+                            history_window=st.session_state.history_window,
+                        )
+                        for event in events:
+                            if isinstance(event, RetrievalEvent):
+                                sources.extend(event.documents)
+                            elif isinstance(event, TokenEvent):
+                                yield event.text
+                            elif isinstance(event, DoneEvent):
+                                log_interaction(request_id, "streamlit", user, prompt, event)
 
                     response = st.write_stream(stream_answer)
 
-                    # For now, let's get sources after streaming. A more advanced implementation
-                    # could yield sources separately.
-                    # This is a simplified approach to get sources after the answer is complete.
-                    # We rerun the pipeline non-streamed to get the final context.
-                    # NOTE: This is not efficient as it runs the query twice.
-                    final_result = run_rag_pipeline(user, prompt, embeddings, st.session_state.messages)
-                    sources = []
-                    for chunk in final_result:
-                        if "context" in chunk:
-                            sources.extend(chunk["context"])
-
                     if sources:
                         st.markdown("---")
                         st.markdown("**Sources:**")
@@ -74,15 +83,18 @@ def chat_page():
                         for source in unique_sources:
                             st.markdown(f"- {source}")
                 else:
-                    response = "Embedding model could not be initialized."
+                    response = "RAG pipeline could not be initialized."
                     st.error(response)
 
             st.session_state.messages.append({"role": "assistant", "content": response})
 
 def main():
-    if "user" not in st.session_state:
+    setup_interaction_logging()
+    user = verify_session_token(st.session_state.get("auth_token"))
+    if not user:
         login_page()
     else:
+        st.session_state["user"] = user
         chat_page()
 
 if __name__ == "__main__":
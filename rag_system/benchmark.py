@@ -0,0 +1,316 @@
+"""
+Offline benchmarks for ingestion, retrieval and end-to-end answering.
+
+Generates a synthetic txt/csv/docx corpus in a scratch directory, points the
+data, vector store and cache settings at it, and runs
+load_documents_from_directories, create_or_load_vectorstore and
+run_rag_pipeline with a deterministic fake LLM and a hash-based embedding
+stand-in, so no API key, network or model download is needed. Results are
+written as JSON so runs of different versions can be compared. Memory peaks
+are traced with tracemalloc and cover Python allocations only; native
+memory (e.g. chromadb's index or torch) shows up in the process max RSS.
+
+    python benchmark.py --files 20 --queries 50 --output results.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+import config.settings as settings
+
+WORDS = (
+    "project nova budget revenue quarter strategy security audit employee review "
+    "policy training roadmap customer product launch optimizer platform compliance "
+    "vendor contract forecast hiring infrastructure cloud migration incident report "
+    "guideline benefit office meeting milestone analytics dashboard risk innovation"
+).split()
+TIERS = ("public", "worker", "admin")
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: random.Random) -> str:
+    return " ".join(_sentence(rng) for _ in range(rng.randint(3, 6)))
+
+
+def write_docx(path: str, paragraphs: List[str]):
+    """Writes a minimal .docx file (one run per paragraph)."""
+    body = "".join(f"<w:p><w:r><w:t>{escape(paragraph)}</w:t></w:r></w:p>" for paragraph in paragraphs)
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{body}</w:body></w:document>'
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", DOCX_CONTENT_TYPES)
+        docx.writestr("_rels/.rels", DOCX_RELS)
+        docx.writestr("word/document.xml", document)
+
+
+def generate_corpus(data_dir: str, files_per_type: int, paragraphs: int, csv_rows: int, seed: int) -> Dict[str, Any]:
+    """Writes files_per_type .txt, .csv and .docx files, spread over the tier directories."""
+    rng = random.Random(seed)
+    counts = {".txt": 0, ".csv": 0, ".docx": 0}
+    for i in range(files_per_type):
+        tier_dir = os.path.join(data_dir, TIERS[i % len(TIERS)])
+        os.makedirs(tier_dir, exist_ok=True)
+
+        with open(os.path.join(tier_dir, f"report_{i}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(_paragraph(rng) for _ in range(paragraphs)))
+
+        with open(os.path.join(tier_dir, f"records_{i}.csv"), "w", encoding="utf-8") as f:
+            f.write("id,owner,topic,status,notes\n")
+            for row in range(csv_rows):
+                f.write(f"{row},{rng.choice(WORDS)},{rng.choice(WORDS)},{rng.choice(['open', 'closed'])},"
+                        f"\"{_sentence(rng)}\"\n")
+
+        write_docx(os.path.join(tier_dir, f"guide_{i}.docx"), [_paragraph(rng) for _ in range(paragraphs)])
+        for extension in counts:
+            counts[extension] += 1
+
+    return {"files": counts, "bytes": directory_size(data_dir)}
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(root, filename))
+    return total
+
+
+def measure(fn: Callable[[], Any]) -> Tuple[Any, float, int]:
+    """
+    Runs fn, returning its result, wall time in seconds and peak traced
+    memory in bytes. tracemalloc only sees Python allocations; native memory
+    (chromadb's index, numpy or torch buffers) is not counted, so the
+    process's max RSS is reported alongside.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def max_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process so far, where the platform reports it."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(pick(0.5) * 1000, 3),
+        "p90_ms": round(pick(0.9) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def configure(workdir: str):
+    """Points the data, vector store and cache settings at the scratch directory."""
+    data_dir = os.path.join(workdir, "data")
+    settings.DATA_DIR = data_dir
+    settings.PUBLIC_DATA_DIR = os.path.join(data_dir, "public")
+    settings.WORKER_DATA_DIR = os.path.join(data_dir, "worker")
+    settings.ADMIN_DATA_DIR = os.path.join(data_dir, "admin")
+    settings.DATA_TIERS = {
+        "public": settings.PUBLIC_DATA_DIR,
+        "worker": settings.WORKER_DATA_DIR,
+        "admin": settings.ADMIN_DATA_DIR,
+    }
+    settings.VECTOR_STORE_DIR = os.path.join(workdir, "vector_store")
+    settings.LEXICAL_INDEX_PATH = os.path.join(settings.VECTOR_STORE_DIR, "lexical_index.sqlite3")
+    settings.EMBEDDING_CACHE_PATH = os.path.join(workdir, "embedding_cache", "embeddings.sqlite3")
+    settings.LOGS_DIR = os.path.join(workdir, "logs")
+    return data_dir
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run(args) -> Dict[str, Any]:
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag-benchmark-")
+    data_dir = configure(workdir)
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": vars(args),
+        }
+    }
+
+    # Imported after configure() so the modules pick up the scratch paths.
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    import core.retrieval as retrieval
+    from core.embeddings import CachedEmbeddings, EmbeddingCache
+    from core.telemetry import get_collector
+    from core.vectorstore import create_or_load_vectorstore
+    from users.schema import User
+    from utils.file_io import load_documents_from_directories
+
+    try:
+        results["corpus"] = generate_corpus(data_dir, args.files, args.paragraphs, args.csv_rows, args.seed)
+        dir_paths = list(settings.DATA_TIERS.values())
+
+        documents, seconds, peak = measure(lambda: load_documents_from_directories(dir_paths))
+        total_files = sum(results["corpus"]["files"].values())
+        results["load_documents"] = {
+            "documents": len(documents),
+            "seconds": round(seconds, 3),
+            "files_per_second": round(total_files / seconds, 2),
+            "mb_per_second": round(results["corpus"]["bytes"] / seconds / 1e6, 3),
+            "peak_memory_bytes": peak,
+        }
+        del documents
+
+        embeddings = CachedEmbeddings(
+            DeterministicFakeEmbedding(size=args.embedding_size), "deterministic-fake",
+            cache=EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_ENTRIES),
+        )
+        vector_store, seconds, peak = measure(lambda: create_or_load_vectorstore(dir_paths, embeddings))
+        if vector_store is None:
+            raise RuntimeError("create_or_load_vectorstore failed")
+        chunks = len(vector_store.get(include=[])["ids"])
+        results["ingest"] = {
+            "chunks": chunks,
+            "seconds": round(seconds, 3),
+            "chunks_per_second": round(chunks / seconds, 2),
+            "peak_memory_bytes": peak,
+            "index_bytes": directory_size(settings.VECTOR_STORE_DIR),
+            "embedding_cache_bytes": directory_size(os.path.dirname(settings.EMBEDDING_CACHE_PATH)),
+        }
+        _, seconds, peak = measure(lambda: create_or_load_vectorstore(dir_paths, embeddings))
+        results["reingest_unchanged"] = {"seconds": round(seconds, 3), "peak_memory_bytes": peak}
+
+        # A deterministic LLM stands in for OpenRouter in run_rag_pipeline.
+        fake_llm = FakeListChatModel(responses=[_paragraph(random.Random(args.seed))])
+        retrieval.get_llm = lambda model_name=None: fake_llm
+        rng = random.Random(args.seed + 1)
+        questions = [f"What is the {rng.choice(WORDS)} {rng.choice(WORDS)} status?" for _ in range(args.queries)]
+
+        for role in args.roles:
+            user = User(username=f"benchmark_{role}", role=role, code="")
+            first_chunk, latencies = [], []
+            # The first call builds the role's pipeline; it is reported separately.
+            _, warmup, warmup_peak = measure(lambda: list(retrieval.run_rag_pipeline(user, "warm up", embeddings, [])))
+            # Latencies are measured without tracemalloc, which slows allocations down.
+            for question in questions:
+                start = time.perf_counter()
+                first = None
+                for _ in retrieval.run_rag_pipeline(user, question, embeddings, []):
+                    if first is None:
+                        first = time.perf_counter() - start
+                latencies.append(time.perf_counter() - start)
+                first_chunk.append(first or 0.0)
+            # A second, traced pass over the same questions for the memory peak.
+            _, _, query_peak = measure(lambda: [
+                list(retrieval.run_rag_pipeline(user, question, embeddings, [])) for question in questions
+            ])
+            results.setdefault("query", {})[role] = {
+                "pipeline_build_seconds": round(warmup, 3),
+                "pipeline_build_peak_memory_bytes": warmup_peak,
+                "first_chunk": percentiles(first_chunk),
+                "end_to_end": percentiles(latencies),
+                "peak_memory_bytes": query_peak,
+            }
+
+        results["stages"] = get_collector().snapshot()["distributions"]
+        results["process"] = {"max_rss_bytes": max_rss_bytes()}
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline RAG ingestion and query benchmarks.")
+    parser.add_argument("--files", type=int, default=12, help="files of each type (txt, csv, docx)")
+    parser.add_argument("--paragraphs", type=int, default=30, help="paragraphs per txt/docx file")
+    parser.add_argument("--csv-rows", type=int, default=200, help="rows per csv file")
+    parser.add_argument("--queries", type=int, default=50, help="questions per role")
+    parser.add_argument("--roles", nargs="+", default=["public", "admin"])
+    parser.add_argument("--embedding-size", type=int, default=384)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workdir", help="scratch directory (kept); a temporary one by default")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary scratch directory")
+    parser.add_argument("--output", help="JSON results path (default: benchmark_results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    results = run(args)
+    output = args.output or os.path.join(
+        "benchmark_results", f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(json.dumps({key: results[key] for key in ("load_documents", "ingest", "query") if key in results}, indent=2))
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
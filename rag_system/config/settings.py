@@ -1,4 +1,5 @@
 import os
+import secrets
 from dotenv import load_dotenv, find_dotenv, set_key
 
 def _get_or_set_env_var(key_name: str, prompt_message: str, optional: bool = True):
@@ -40,7 +41,19 @@ TAVILY_API_KEY = _get_or_set_env_var(
 # --- Basic Settings ---
 BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 MODEL_NAME = os.getenv("OPENROUTER_MODEL_NAME", "meta-llama/llama-3.3-70b-instruct")
+
+# Pooled HTTP client shared by every LLM instance in the process.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
 CREDENTIALS_FILE = os.path.join(os.path.dirname(__file__), 'credentials.json')
+# Signed session tokens let later requests skip bcrypt. Without a configured
+# secret, tokens are only valid in the process that issued them.
+AUTH_TOKEN_SECRET = os.getenv("AUTH_TOKEN_SECRET") or secrets.token_hex(32)
+AUTH_TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", "3600"))
+# Threads running bcrypt verification for async callers.
+AUTH_BCRYPT_WORKERS = int(os.getenv("AUTH_BCRYPT_WORKERS", "4"))
 
 # --- Data Directories ---
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
@@ -48,8 +61,154 @@ PUBLIC_DATA_DIR = os.path.join(DATA_DIR, 'public')
 WORKER_DATA_DIR = os.path.join(DATA_DIR, 'worker')
 ADMIN_DATA_DIR = os.path.join(DATA_DIR, 'admin')
 
+# Data tier of each directory; every ingested chunk is tagged with its tier.
+DATA_TIERS = {
+    'public': PUBLIC_DATA_DIR,
+    'worker': WORKER_DATA_DIR,
+    'admin': ADMIN_DATA_DIR,
+}
+# Files outside every tier directory belong to the most restricted tier.
+RESTRICTED_TIER = 'admin'
+
+# Data tiers each role may read. Roles not listed here can read nothing.
+ROLE_TIERS = {
+    'admin': ['public', 'worker', 'admin'],
+    'manager': ['public', 'worker', 'admin'],
+    'worker': ['public', 'worker'],
+    'public': ['public'],
+}
+
+# --- Ingestion Settings ---
+# Files are parsed in a worker pool; processes avoid the GIL for CPU-bound
+# parsers (docx, CSV) at the cost of pickling the loaded documents.
+LOADER_MAX_WORKERS = int(os.getenv("LOADER_MAX_WORKERS", str(min(8, os.cpu_count() or 1))))
+LOADER_USE_PROCESSES = os.getenv("LOADER_USE_PROCESSES", "false").lower() == "true"
+# Number of chunks embedded and written to the vector store at once.
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+# Seconds between manifest checkpoints during a long ingest (it is always saved at the end).
+INGEST_MANIFEST_SAVE_INTERVAL = float(os.getenv("INGEST_MANIFEST_SAVE_INTERVAL", "30"))
+
+# --- Embedding Settings ---
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# Vectors are cached on disk by content hash; set the cap to 0 to disable.
+EMBEDDING_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'embedding_cache', 'embeddings.sqlite3')
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# --- Chunking Settings ---
+# Documents are split before embedding; sizes are in characters, or in
+# embedding-model tokens for the "tokens" splitter.
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "800"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "120"))
+# Per-extension overrides of the splitter settings above.
+CHUNKING_POLICY = {
+    ".txt": {"splitter": "recursive"},
+    ".docx": {"splitter": "recursive"},
+    # CSV rows are loaded one per document and rarely need splitting.
+    ".csv": {"splitter": "recursive", "chunk_overlap": 0, "separators": ["\n", " ", ""]},
+}
+
 # --- Vector Store Settings ---
+# A single collection shared by all roles; access is enforced with tier filters.
 VECTOR_STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'vector_store')
+# BM25 index over the same chunks, persisted next to the vector store.
+LEXICAL_INDEX_PATH = os.path.join(VECTOR_STORE_DIR, 'lexical_index.sqlite3')
+# Game scenarios get a store (and manifest) of their own per scenario, holding
+# only that scenario's files, so they never mix with the corporate corpus.
+SCENARIO_VECTOR_STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scenario_vector_stores')
+# Minimum number of seconds between checks of the data directories for changes.
+CORPUS_REFRESH_INTERVAL = float(os.getenv("CORPUS_REFRESH_INTERVAL", "30"))
+
+# --- Retrieval Settings ---
+# Number of candidate chunks retrieved, and how many of them are passed to
+# the LLM after re-ranking.
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "20"))
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+# Fuse BM25 lexical results with vector results (reciprocal rank fusion),
+# which catches exact names, codes and figures that embeddings miss.
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# --- Re-ranking Settings ---
+# "mmr" (diversity over cached embeddings), "cross-encoder" or "none".
+RERANKER = os.getenv("RERANKER", "mmr")
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Candidates this similar (word shingles) to a better one are dropped.
+DEDUP_SIMILARITY = float(os.getenv("DEDUP_SIMILARITY", "0.9"))
+# Upper bound on the estimated tokens of retrieved context sent to the LLM.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# --- Question Rewriting Settings ---
+# Follow-up questions are rewritten into standalone ones before retrieval.
+# "auto" skips the LLM call when a question looks self-contained, "always"
+# rewrites every follow-up and "never" retrieves with the raw question.
+REWRITE_MODE = os.getenv("REWRITE_MODE", "auto")
+# Optional smaller model used only for rewriting.
+REWRITE_MODEL_NAME = os.getenv("REWRITE_MODEL_NAME", MODEL_NAME)
+# Retrieve with the raw question while the rewrite runs, and keep those
+# results when the rewrite is at least this similar to the raw question.
+REWRITE_SPECULATIVE = os.getenv("REWRITE_SPECULATIVE", "true").lower() == "true"
+REWRITE_REUSE_SIMILARITY = float(os.getenv("REWRITE_REUSE_SIMILARITY", "0.8"))
+
+# --- Chat History Settings ---
+# Only the most recent turns that fit in this many (estimated) tokens are
+# sent to the LLM; with summarization on, older turns are summarized.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+HISTORY_SUMMARIZE = os.getenv("HISTORY_SUMMARIZE", "false").lower() == "true"
+
+# --- Answer Cache Settings ---
+# Session-local cache of answers to semantically identical questions.
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "900"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "128"))
+
+# --- Web Fetch Settings ---
+# Used by the URL parser tool. Responses are read up to FETCH_MAX_BYTES and
+# cached on disk for FETCH_CACHE_TTL seconds (then revalidated).
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "10"))
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", "2000000"))
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "10"))
+FETCH_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'web_cache')
+FETCH_CACHE_TTL = int(os.getenv("FETCH_CACHE_TTL", "3600"))
+# Least recently used responses are evicted beyond either limit.
+FETCH_CACHE_MAX_ENTRIES = int(os.getenv("FETCH_CACHE_MAX_ENTRIES", "1000"))
+FETCH_CACHE_MAX_BYTES = int(os.getenv("FETCH_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+# Estimated tokens of page text handed to the agent.
+URL_PARSER_TOKEN_BUDGET = int(os.getenv("URL_PARSER_TOKEN_BUDGET", "2000"))
+
+# --- Web Search Settings ---
+# Results are cached per normalized query; provider calls are limited to
+# WEB_SEARCH_RATE per second, in bursts of up to WEB_SEARCH_BURST.
+WEB_SEARCH_MAX_RESULTS = int(os.getenv("WEB_SEARCH_MAX_RESULTS", "5"))
+WEB_SEARCH_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL", "600"))
+WEB_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("WEB_SEARCH_CACHE_MAX_ENTRIES", "512"))
+WEB_SEARCH_RATE = float(os.getenv("WEB_SEARCH_RATE", "1"))
+WEB_SEARCH_BURST = int(os.getenv("WEB_SEARCH_BURST", "5"))
+
+# --- Scenario Settings ---
+# Seconds between checks of the scenarios directory for changed files.
+SCENARIO_REFRESH_INTERVAL = float(os.getenv("SCENARIO_REFRESH_INTERVAL", "2"))
+
+# --- Session Store Settings ---
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+# Sessions expire this many seconds after they were last used; beyond
+# SESSION_MAX_COUNT the least recently used sessions are evicted.
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+
+# --- Telemetry ---
+# Spans and stage timings are collected in-process and exposed at /metrics;
+# quantiles are computed over the last TELEMETRY_WINDOW observations.
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() == "true"
+TELEMETRY_WINDOW = int(os.getenv("TELEMETRY_WINDOW", "2048"))
+# Print the agent's reasoning and tool calls to stdout.
+AGENT_VERBOSE = os.getenv("AGENT_VERBOSE", "false").lower() == "true"
 
 # --- Logging ---
 LOGS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
+# Structured (JSON lines) interaction log shared by the CLI, app and server.
+INTERACTION_LOG_PATH = os.path.join(LOGS_DIR, 'interactions.jsonl')
+INTERACTION_LOG_MAX_BYTES = int(os.getenv("INTERACTION_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+INTERACTION_LOG_BACKUPS = int(os.getenv("INTERACTION_LOG_BACKUPS", "5"))
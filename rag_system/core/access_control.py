@@ -1,65 +1,199 @@
+import asyncio
+import hashlib
 import json
 import os
-from typing import List, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
 
-from config.settings import (ADMIN_DATA_DIR, CREDENTIALS_FILE,
-                             PUBLIC_DATA_DIR, WORKER_DATA_DIR)
+from config.settings import (AUTH_BCRYPT_WORKERS, AUTH_TOKEN_SECRET, AUTH_TOKEN_TTL,
+                             CREDENTIALS_FILE, DATA_TIERS, RESTRICTED_TIER, ROLE_TIERS)
 from users.schema import User
-from utils.security import verify_password
+from utils.security import sign_token, verify_password, verify_token
 
+if TYPE_CHECKING:
+    # Only for annotations; importing LangChain here would slow down the CLI login prompt.
+    from langchain_core.documents import Document
 
-def load_users() -> List[User]:
+
+def load_users(path: str = CREDENTIALS_FILE) -> List[User]:
     """Loads users from the credentials file."""
-    if not os.path.exists(CREDENTIALS_FILE):
+    if not os.path.exists(path):
         return []
-    with open(CREDENTIALS_FILE, 'r') as f:
+    with open(path, 'r') as f:
         user_data = json.load(f)
     return [User(**data) for data in user_data]
 
-USERS = load_users()
+class UserIndex:
+    """
+    Users keyed by username, reloaded whenever the credentials file's
+    modification time changes.
+    """
+
+    def __init__(self, path: str = CREDENTIALS_FILE):
+        self.path = path
+        self._users: Dict[str, User] = {}
+        self._mtime_ns: Optional[int] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        with self._lock:
+            if self._loaded and mtime_ns == self._mtime_ns:
+                return
+            try:
+                self._users = {user.username: user for user in load_users(self.path)}
+            except (ValueError, TypeError) as e:
+                # Keep the previous users, e.g. while the file is being rewritten.
+                print(f"Error loading credentials: {e}")
+                return
+            self._mtime_ns = mtime_ns
+            self._loaded = True
+
+    def get(self, username: str) -> Optional[User]:
+        self._refresh()
+        return self._users.get(username)
+
+    def all(self) -> List[User]:
+        self._refresh()
+        return list(self._users.values())
+
+_user_index = UserIndex()
+_bcrypt_executor = ThreadPoolExecutor(max_workers=AUTH_BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
+def list_users() -> List[User]:
+    """Returns all users, from the cached index."""
+    return _user_index.all()
 
 def authenticate_user(username: str, code: str) -> Optional[User]:
     """
     Authenticates a user by username and code.
     Returns the User object if authentication is successful, otherwise None.
     """
-    for user in USERS:
-        if user.username == username and verify_password(code, user.code):
-            return user
+    user = _user_index.get(username)
+    if user and verify_password(code, user.code):
+        return user
     return None
 
+async def authenticate_user_async(username: str, code: str) -> Optional[User]:
+    """Like authenticate_user, running bcrypt on a worker thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bcrypt_executor, authenticate_user, username, code)
+
+def _credential_fingerprint(user: User) -> str:
+    # Changes whenever the user's code (hash) changes, invalidating their tokens.
+    return hashlib.sha256(user.code.encode('utf-8')).hexdigest()[:16]
+
+def issue_session_token(user: User, ttl: int = AUTH_TOKEN_TTL) -> str:
+    """
+    Returns a signed token for an authenticated user, valid for ttl seconds.
+    Presenting it later skips the bcrypt verification.
+    """
+    return sign_token({
+        "sub": user.username,
+        "role": user.role,
+        "exp": int(time.time()) + ttl,
+        "fp": _credential_fingerprint(user),
+    }, AUTH_TOKEN_SECRET)
+
+def verify_session_token(token: Optional[str]) -> Optional[User]:
+    """
+    Returns the user a session token was issued to, or None if the token is
+    invalid or expired, or the user's role or credentials have changed since.
+    """
+    if not token:
+        return None
+    payload = verify_token(token, AUTH_TOKEN_SECRET)
+    if not payload or payload.get("exp", 0) < time.time():
+        return None
+    user = _user_index.get(payload.get("sub", ""))
+    if not user or user.role != payload.get("role") or _credential_fingerprint(user) != payload.get("fp"):
+        return None
+    return user
+
+class AccessPolicy:
+    """
+    The role-based access policy, compiled once from the role -> tiers and
+    tier -> directory tables. Tier directories are normalized up front and
+    the tier of each path is cached, so authorizing a retrieved document is
+    a dictionary lookup and a set membership test.
+    """
+
+    def __init__(self, role_tiers: Dict[str, List[str]] = ROLE_TIERS,
+                 data_tiers: Dict[str, str] = DATA_TIERS, restricted_tier: str = RESTRICTED_TIER):
+        self.restricted_tier = restricted_tier
+        self._data_tiers = dict(data_tiers)
+        self._role_tiers: Dict[str, FrozenSet[str]] = {role: frozenset(tiers) for role, tiers in role_tiers.items()}
+        # Most specific directory first, in case tier directories are nested.
+        self._prefixes: List[Tuple[str, str]] = sorted(
+            ((os.path.join(os.path.abspath(tier_dir), ''), tier) for tier, tier_dir in data_tiers.items()),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+        self.tier_of = lru_cache(maxsize=65536)(self._tier_of)
+
+    def _tier_of(self, filepath: str) -> str:
+        filepath = os.path.abspath(filepath)
+        for prefix, tier in self._prefixes:
+            if filepath.startswith(prefix):
+                return tier
+        return self.restricted_tier
+
+    def tiers(self, role: str) -> List[str]:
+        """The data tiers a role may read, in the order of the tier table."""
+        allowed = self._role_tiers.get(role, frozenset())
+        return [tier for tier in self._data_tiers if tier in allowed]
+
+    def directories(self, role: str) -> List[str]:
+        """The data directories a role may read."""
+        return [self._data_tiers[tier] for tier in self.tiers(role)]
+
+    def can_read(self, role: str, filepath: str) -> bool:
+        return self.tier_of(filepath) in self._role_tiers.get(role, frozenset())
+
+    def authorize_documents(self, documents: List["Document"], tiers: Iterable[str]) -> List["Document"]:
+        """
+        Returns the documents readable with the given tiers, judged by their
+        source path (or, without one, their tier metadata).
+        """
+        allowed = frozenset(tiers)
+        tier_of = self.tier_of
+        return [
+            document for document in documents
+            if (tier_of(document.metadata["source"]) if document.metadata.get("source")
+                else document.metadata.get("tier")) in allowed
+        ]
+
+    def metadata_filter(self, tiers: Iterable[str]) -> Dict[str, Any]:
+        """The vector store metadata filter restricting results to the given tiers."""
+        return {"tier": {"$in": list(tiers)}}
+
+_access_policy = AccessPolicy()
+
+def get_access_policy() -> AccessPolicy:
+    return _access_policy
+
 def authorize_access(user: User, filepath: str) -> bool:
     """
     Authorizes a user's access to a file based on their role.
     """
-    filepath = os.path.abspath(filepath)
-    
-    if user.role == 'admin':
-        return True
-    
-    if user.role == 'manager':
-        return filepath.startswith(os.path.abspath(PUBLIC_DATA_DIR)) or \
-               filepath.startswith(os.path.abspath(WORKER_DATA_DIR))
-               
-    if user.role == 'worker':
-        return filepath.startswith(os.path.abspath(PUBLIC_DATA_DIR)) or \
-               filepath.startswith(os.path.abspath(WORKER_DATA_DIR))
-        
-    if user.role == 'public':
-        return filepath.startswith(os.path.abspath(PUBLIC_DATA_DIR))
-        
-    return False
+    return _access_policy.can_read(user.role, filepath)
 
 def get_accessible_directories(user: User) -> List[str]:
     """
     Returns a list of directories accessible to the user based on their role.
     """
-    if user.role == 'admin':
-        return [PUBLIC_DATA_DIR, WORKER_DATA_DIR, ADMIN_DATA_DIR]
-    if user.role == 'manager':
-        return [PUBLIC_DATA_DIR, WORKER_DATA_DIR, ADMIN_DATA_DIR]
-    if user.role == 'worker':
-        return [PUBLIC_DATA_DIR, WORKER_DATA_DIR]
-    if user.role == 'public':
-        return [PUBLIC_DATA_DIR]
-    return []
+    return _access_policy.directories(user.role)
+
+def get_data_tier(filepath: str) -> str:
+    """
+    Returns the data tier a file belongs to. Files outside every tier
+    directory are treated as the most restricted tier.
+    """
+    return _access_policy.tier_of(filepath)
@@ -0,0 +1,148 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config.settings import (ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_SIMILARITY,
+                             ANSWER_CACHE_TTL)
+
+
+@dataclass
+class CachedAnswer:
+    """A previously generated answer and the documents it was based on."""
+    question: str
+    answer: str
+    documents: List[Document]
+    scope: Hashable
+    corpus_version: str
+    vector: np.ndarray
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """
+    A session-local cache of answers keyed by the question's embedding.
+    A lookup hits when a stored question from the same access scope and
+    corpus version has a cosine similarity of at least `threshold`.
+    Entries expire after `ttl` seconds, the least recently used entries are
+    evicted beyond `max_entries`, and entries from an older corpus version
+    are dropped as soon as a newer version is seen.
+
+    It also remembers the standalone form of follow-up questions, keyed on
+    the raw question and the chat history it was rewritten with, so a
+    repeated follow-up reaches the answer lookup without a rewrite LLM call.
+    """
+
+    def __init__(self, embeddings, threshold: float = ANSWER_CACHE_SIMILARITY,
+                 ttl: float = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_id = 0
+        # (raw question, chat history) key -> (standalone question, created_at)
+        self._rewrites: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(question.strip()), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, corpus_version: str):
+        now = time.monotonic()
+        for entry_id in [
+            entry_id for entry_id, entry in self._entries.items()
+            if entry.corpus_version != corpus_version or now - entry.created_at > self.ttl
+        ]:
+            del self._entries[entry_id]
+
+    def lookup(self, question: str, scope: Hashable, corpus_version: str) -> Optional[CachedAnswer]:
+        """Returns the most similar cached answer above the threshold, if any."""
+        if self.max_entries <= 0:
+            return None
+        vector = self._embed(question)
+        with self._lock:
+            self._expire(corpus_version)
+            best_id, best_score = None, self.threshold
+            for entry_id, entry in self._entries.items():
+                if entry.scope != scope:
+                    continue
+                score = float(np.dot(vector, entry.vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                return None
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id]
+
+    def store(self, question: str, scope: Hashable, corpus_version: str,
+              answer: str, documents: List[Document]):
+        """Caches an answer, evicting the least recently used entries over the cap."""
+        if self.max_entries <= 0:
+            return
+        entry = CachedAnswer(
+            question=question,
+            answer=answer,
+            documents=documents,
+            scope=scope,
+            corpus_version=corpus_version,
+            vector=self._embed(question),
+            created_at=time.monotonic(),
+        )
+        with self._lock:
+            self._expire(corpus_version)
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _rewrite_key(question: str, chat_history: list) -> str:
+        digest = hashlib.sha256(" ".join(question.lower().split()).encode("utf-8"))
+        for message in chat_history:
+            digest.update(f"\0{message.type}\0{message.content}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def lookup_rewrite(self, question: str, chat_history: list) -> Optional[str]:
+        """
+        Returns the standalone question stored for the same question and
+        LangChain chat history, if any. Needs no embedding or LLM call.
+        """
+        if self.max_entries <= 0:
+            return None
+        key = self._rewrite_key(question, chat_history)
+        with self._lock:
+            cached = self._rewrites.get(key)
+            if cached is None:
+                return None
+            if time.monotonic() - cached[1] > self.ttl:
+                del self._rewrites[key]
+                return None
+            self._rewrites.move_to_end(key)
+            return cached[0]
+
+    def store_rewrite(self, question: str, chat_history: list, standalone_question: str):
+        """Remembers the standalone form of a question for a chat history."""
+        if self.max_entries <= 0:
+            return
+        key = self._rewrite_key(question, chat_history)
+        with self._lock:
+            self._rewrites[key] = (standalone_question, time.monotonic())
+            self._rewrites.move_to_end(key)
+            while len(self._rewrites) > self.max_entries:
+                self._rewrites.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._rewrites.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
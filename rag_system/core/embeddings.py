@@ -1,17 +1,196 @@
-from langchain_community.embeddings import SentenceTransformerEmbeddings
+import atexit
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
 
-def get_embedding_model():
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core.telemetry import get_collector, span
+from config.settings import (EMBEDDING_BATCH_SIZE, EMBEDDING_CACHE_MAX_ENTRIES,
+                             EMBEDDING_CACHE_PATH, EMBEDDING_MODEL_NAME)
+
+
+class EmbeddingCache:
     """
-    Initializes and returns the sentence-transformer embedding model.
+    An on-disk SQLite cache of embedding vectors keyed by a hash of the
+    model name and the text. The least recently used entries are evicted
+    once the cache holds more than max_entries vectors.
+
+    Lookups only read: access times are buffered in memory and written
+    in one transaction every access_flush_size hits, or before the next
+    insert and eviction, so cached lookups never cost a disk sync.
     """
-    # Using a popular, lightweight model.
+
+    def __init__(self, path: str, max_entries: int, access_flush_size: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.access_flush_size = access_flush_size
+        self._pending_access: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings (last_access)")
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Returns the cached vectors for the given keys and marks them as used."""
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit.
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            now = time.time()
+            self._pending_access.update((key, now) for key in found)
+            if len(self._pending_access) >= self.access_flush_size:
+                self._flush_access()
+                self._conn.commit()
+        return found
+
+    def _flush_access(self):
+        # Writes the buffered access times; the caller holds the lock and commits.
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(last_access, key) for key, last_access in self._pending_access.items()],
+            )
+            self._pending_access.clear()
+
+    def flush(self):
+        """Writes the buffered access times to disk."""
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """Stores vectors and evicts the least recently used ones over the cap."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._flush_access()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [(key, vector.astype(np.float32).tobytes(), now) for key, vector in items.items()],
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model so that texts are embedded in batches of
+    batch_size, vectors are handled as float32 NumPy arrays and every
+    vector is looked up in (and stored to) a content-hash keyed cache
+    before the model is asked to embed it.
+    """
+
+    def __init__(self, model: Embeddings, model_name: str, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 cache: Optional[EmbeddingCache] = None):
+        self.model = model
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache = cache
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """Embeds texts, returning a (len(texts), dim) float32 array."""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        keys = [self._key(text) for text in texts]
+        cached = self.cache.get_many(list(set(keys))) if self.cache else {}
+
+        # Embed each distinct missing text once, in batches.
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        missing_keys = list(missing)
+        computed = {}
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[start:start + self.batch_size]
+            with span("embed", texts=len(batch_keys)):
+                vectors = np.asarray(
+                    self.model.embed_documents([missing[key] for key in batch_keys]), dtype=np.float32
+                )
+            computed.update(zip(batch_keys, vectors))
+        if self.cache:
+            self.cache.put_many(computed)
+        get_collector().increment("embedding_cache_misses_total", len(missing_keys))
+        get_collector().increment("embedding_cache_hits_total", len(keys) - len(missing_keys))
+
+        cached.update(computed)
+        return np.stack([cached[key] for key in keys])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+
+_embedding_model: Optional[CachedEmbeddings] = None
+_embedding_model_lock = threading.Lock()
+
+
+def _load_embedding_model() -> Optional[CachedEmbeddings]:
+    # Using a popular, lightweight model by default.
     # You can choose other models from sentence-transformers.
-    model_name = "all-MiniLM-L6-v2"
-    
+    model_name = EMBEDDING_MODEL_NAME
+
     try:
-        embeddings = SentenceTransformerEmbeddings(model_name=model_name)
-        return embeddings
+        # Imported here: sentence-transformers pulls in torch, which takes
+        # seconds and is not needed until the model is first requested.
+        from langchain_community.embeddings import SentenceTransformerEmbeddings
+
+        model = SentenceTransformerEmbeddings(
+            model_name=model_name,
+            encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE},
+        )
+        cache = None
+        if EMBEDDING_CACHE_MAX_ENTRIES > 0:
+            cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES)
+            # Keep the access times of the last lookups for the next process.
+            atexit.register(cache.flush)
+        return CachedEmbeddings(model, model_name, EMBEDDING_BATCH_SIZE, cache)
     except Exception as e:
         print(f"Error initializing embedding model: {e}")
         print("Please ensure you have an internet connection and the required libraries are installed.")
         return None
+
+
+def get_embedding_model():
+    """
+    Returns the process-wide sentence-transformer embedding model, wrapped
+    with batching and the on-disk embedding cache. The model is loaded on
+    the first call and shared by every caller afterwards, so a process
+    holds a single copy in memory. A failed load is retried on the next call.
+    """
+    global _embedding_model
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            _embedding_model = _load_embedding_model()
+        return _embedding_model
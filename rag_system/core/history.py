@@ -0,0 +1,129 @@
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from config.settings import HISTORY_TOKEN_BUDGET
+
+SUMMARY_PROMPT = (
+    "Summarize the following conversation between a user and an assistant "
+    "in a few sentences, keeping names, figures and open questions. "
+    "Extend the existing summary if one is given.\n\n"
+    "Existing summary:\n{summary}\n\nNew messages:\n{messages}"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token for English text)."""
+    return max(1, math.ceil(len(text) / 4))
+
+
+@dataclass
+class HistoryWindow:
+    """The part of a chat history that is sent to the LLM."""
+    messages: List[BaseMessage] = field(default_factory=list)
+    kept_messages: int = 0
+    kept_tokens: int = 0
+    dropped_messages: int = 0
+    dropped_tokens: int = 0
+    summary_tokens: int = 0
+
+
+class ChatHistoryWindow:
+    """
+    Keeps the most recent turns of one conversation that fit in a token
+    budget. Converted LangChain messages and their token counts are cached,
+    so each turn only converts the messages added since the previous one.
+
+    With a summarizer_llm, older turns that fall out of the window are
+    folded into a rolling summary that is sent ahead of the kept turns
+    (and counts against the budget).
+    """
+
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET, summarizer_llm=None,
+                 token_counter: Callable[[str], int] = estimate_tokens):
+        self.token_budget = token_budget
+        self.summarizer_llm = summarizer_llm
+        self.token_counter = token_counter
+        self._converted: List[Tuple[str, str, BaseMessage, int]] = []
+        self._summary = ""
+        self._summarized_upto = 0
+        self._lock = threading.Lock()
+
+    def _convert(self, chat_history: List[Dict[str, str]]):
+        # Chat histories only grow; reuse the cached prefix when it still matches.
+        converted = self._converted
+        prefix = 0
+        while (prefix < len(converted) and prefix < len(chat_history)
+               and converted[prefix][0] == chat_history[prefix]["role"]
+               and converted[prefix][1] == chat_history[prefix]["content"]):
+            prefix += 1
+        if prefix < len(converted):
+            del converted[prefix:]
+            self._summary, self._summarized_upto = "", 0
+
+        for message in chat_history[prefix:]:
+            role, content = message["role"], message["content"]
+            if role == "user":
+                langchain_message = HumanMessage(content=content)
+            elif role == "assistant":
+                langchain_message = AIMessage(content=content)
+            else:
+                continue
+            converted.append((role, content, langchain_message, self.token_counter(content)))
+
+    def _summarize(self, upto: int):
+        new_messages = self._converted[self._summarized_upto:upto]
+        if not new_messages:
+            return
+        transcript = "\n".join(f"{role}: {content}" for role, content, _, _ in new_messages)
+        try:
+            response = self.summarizer_llm.invoke(
+                SUMMARY_PROMPT.format(summary=self._summary or "(none)", messages=transcript)
+            )
+            self._summary = response.content.strip()
+            self._summarized_upto = upto
+        except Exception as e:
+            print(f"Error summarizing chat history: {e}")
+
+    def _fit(self, limit: int) -> Tuple[int, int]:
+        # Index of the oldest kept message and the tokens kept, newest first.
+        start = len(self._converted)
+        kept_tokens = 0
+        while start > 0 and kept_tokens + self._converted[start - 1][3] <= limit:
+            start -= 1
+            kept_tokens += self._converted[start][3]
+        # Never open the window on an assistant reply to a dropped question.
+        while 0 < start < len(self._converted) and self._converted[start][0] == "assistant":
+            kept_tokens -= self._converted[start][3]
+            start += 1
+        return start, kept_tokens
+
+    def window(self, chat_history: List[Dict[str, str]]) -> HistoryWindow:
+        """Returns the messages to send for a {"role", "content"} chat history."""
+        with self._lock:
+            self._convert(chat_history)
+
+            summary_tokens = self.token_counter(self._summary) if self._summary else 0
+            start, kept_tokens = self._fit(self.token_budget - summary_tokens)
+            if self.summarizer_llm and start > self._summarized_upto:
+                self._summarize(start)
+                summary_tokens = self.token_counter(self._summary) if self._summary else 0
+                start, kept_tokens = self._fit(self.token_budget - summary_tokens)
+
+            messages = [entry[2] for entry in self._converted[start:]]
+            if self._summary and start > 0:
+                messages.insert(0, SystemMessage(content=f"Summary of the earlier conversation: {self._summary}"))
+            else:
+                summary_tokens = 0
+
+            return HistoryWindow(
+                messages=messages,
+                kept_messages=len(self._converted) - start,
+                kept_tokens=kept_tokens,
+                dropped_messages=start,
+                dropped_tokens=sum(entry[3] for entry in self._converted[:start]),
+                summary_tokens=summary_tokens,
+            )
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from langchain.schema import Document
+
+from core.access_control import get_data_tier
+from core.telemetry import span
+from utils.chunking import chunk_documents, chunking_fingerprint
+from config.settings import INGEST_BATCH_SIZE, INGEST_MANIFEST_SAVE_INTERVAL
+from utils.file_io import get_file_extension, iter_load_files, list_corpus_files, load_file
+
+MANIFEST_FILENAME = "ingestion_manifest.json"
+
+
+@dataclass
+class FileRecord:
+    """What was ingested for a single corpus file."""
+    path: str
+    size: int
+    mtime_ns: int
+    content_hash: str
+    chunk_ids: List[str] = field(default_factory=list)
+
+
+class IngestionManifest:
+    """
+    Tracks which files have been embedded into a persisted vector store,
+    so that only added, changed or removed files need to be processed.
+    """
+
+    def __init__(self, manifest_path: str, records: Dict[str, FileRecord] = None, chunking: str = None):
+        self.manifest_path = manifest_path
+        self.records: Dict[str, FileRecord] = records or {}
+        # Chunking policy the recorded chunks were produced with.
+        self.chunking = chunking
+
+    @classmethod
+    def load(cls, persist_directory: str) -> "IngestionManifest":
+        """Loads the manifest stored next to a vector store, or an empty one."""
+        manifest_path = os.path.join(persist_directory, MANIFEST_FILENAME)
+        if not os.path.exists(manifest_path):
+            return cls(manifest_path)
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        records = {entry["path"]: FileRecord(**entry) for entry in data.get("files", [])}
+        return cls(manifest_path, records, data.get("chunking"))
+
+    def version(self) -> str:
+        """
+        A fingerprint of the ingested corpus; it changes whenever a file is
+        added, modified or removed, or the chunking policy changes.
+        """
+        digest = hashlib.sha256((self.chunking or "").encode('utf-8'))
+        for path in sorted(self.records):
+            digest.update(f"\0{path}\0{self.records[path].content_hash}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def save(self):
+        """Writes the manifest atomically so a crash never leaves it half-written."""
+        directory = os.path.dirname(self.manifest_path)
+        os.makedirs(directory, exist_ok=True)
+        data = {
+            "chunking": self.chunking,
+            "files": [asdict(record) for record in self.records.values()],
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{MANIFEST_FILENAME}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.manifest_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def hash_file(filepath: str) -> str:
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_chunk_ids(filepath: str, content_hash: str, count: int) -> List[str]:
+    """Deterministic vector ids for the chunks of one version of a file."""
+    prefix = hashlib.sha1(f"{os.path.abspath(filepath)}:{content_hash}".encode('utf-8')).hexdigest()
+    return [f"{prefix}-{i}" for i in range(count)]
+
+
+def load_and_chunk_file(filepath: str) -> List[Document]:
+    """Loads a file and splits it into chunks; runs inside the loader pool."""
+    extension = get_file_extension(filepath)
+    with span("load_document", extension=extension):
+        return chunk_documents(load_file(filepath), extension)
+
+
+def _is_under(path: str, roots: List[str]) -> bool:
+    return any(path == root or path.startswith(os.path.join(root, '')) for root in roots)
+
+
+def _backfill_lexical_index(vector_store, manifest: IngestionManifest, lexical_index):
+    # Chunks ingested before the lexical index existed are copied over from
+    # the vector store, without re-embedding anything.
+    chunk_ids = [chunk_id for record in manifest.records.values() for chunk_id in record.chunk_ids]
+    for start in range(0, len(chunk_ids), INGEST_BATCH_SIZE):
+        stored = vector_store.get(ids=chunk_ids[start:start + INGEST_BATCH_SIZE], include=["documents", "metadatas"])
+        lexical_index.add(stored["ids"], [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(stored["documents"], stored["metadatas"])
+        ])
+
+
+def sync_vectorstore(vector_store, manifest: IngestionManifest, dir_paths: List[str], lexical_index=None,
+                     corpus_roots: Optional[List[str]] = None) -> bool:
+    """
+    Brings a persisted vector store up to date with the files in dir_paths.
+    Unchanged files are skipped without being read, changed files are
+    re-embedded and files under dir_paths that disappeared have their
+    vectors deleted. Files are split into chunks before embedding and
+    every chunk is tagged with the data tier of its file. A change of
+    chunking policy re-embeds every file.
+
+    When a lexical_index (core.lexical_index.BM25Index) is given, it is
+    kept in step with the vector store, chunk for chunk. When corpus_roots
+    is given, files outside all of them do not belong in the store and are
+    deleted even if they are not under dir_paths.
+    Returns True if the vector store was modified.
+
+    Callers must not sync the same store from several threads at once;
+    core.vectorstore serializes this behind a process-wide lock.
+    """
+    if not manifest.exists():
+        # A store written before manifests existed holds untracked (and
+        # usually duplicated) vectors; start it over from a clean slate.
+        existing_ids = vector_store.get(include=[])["ids"]
+        if existing_ids:
+            vector_store.delete(ids=existing_ids)
+        if lexical_index is not None:
+            lexical_index.clear()
+    elif lexical_index is not None and not len(lexical_index):
+        _backfill_lexical_index(vector_store, manifest, lexical_index)
+
+    def delete_chunks(chunk_ids: List[str]):
+        vector_store.delete(ids=chunk_ids)
+        if lexical_index is not None:
+            lexical_index.remove(chunk_ids)
+
+    roots = [os.path.abspath(d) for d in dir_paths]
+    current_files = [os.path.abspath(p) for p in list_corpus_files(dir_paths)]
+    current_paths = set(current_files)
+    changed = False
+
+    chunking = chunking_fingerprint()
+    rechunk = manifest.chunking != chunking
+    manifest.chunking = chunking
+
+    # After a chunking change, files outside dir_paths are dropped too and
+    # re-ingested the next time their own directories are synced.
+    corpus_roots = [os.path.abspath(d) for d in corpus_roots] if corpus_roots is not None else None
+    removed = [
+        p for p in manifest.records
+        if p not in current_paths and (
+            rechunk or _is_under(p, roots) or (corpus_roots is not None and not _is_under(p, corpus_roots))
+        )
+    ]
+    for path in removed:
+        record = manifest.records.pop(path)
+        if record.chunk_ids:
+            delete_chunks(record.chunk_ids)
+        changed = True
+
+    to_ingest = {}
+    for filepath in current_files:
+        stat = os.stat(filepath)
+        record = manifest.records.get(filepath)
+        if record and not rechunk and record.size == stat.st_size and record.mtime_ns == stat.st_mtime_ns:
+            continue
+
+        content_hash = hash_file(filepath)
+        if record and not rechunk and record.content_hash == content_hash:
+            # Touched but not modified: only refresh the stat fingerprint.
+            record.size, record.mtime_ns = stat.st_size, stat.st_mtime_ns
+            changed = True
+            continue
+
+        to_ingest[filepath] = (stat, content_hash)
+
+    # Files are parsed and chunked in parallel; their chunks are embedded
+    # and written in batches as they arrive, so only a bounded number of
+    # documents is ever held in memory. The manifest is saved at most every
+    # INGEST_MANIFEST_SAVE_INTERVAL seconds meanwhile: chunk ids are
+    # deterministic, so files whose records were lost in a crash are simply
+    # upserted again on the next sync.
+    batch_documents, batch_ids, batch_records = [], [], []
+    last_save = time.monotonic()
+
+    def flush():
+        nonlocal last_save
+        if batch_documents:
+            with span("vector_store_add", chunks=len(batch_documents)):
+                vector_store.add_documents(batch_documents, ids=batch_ids)
+            if lexical_index is not None:
+                with span("lexical_index_add", chunks=len(batch_documents)):
+                    lexical_index.add(batch_ids, batch_documents)
+        for new_record in batch_records:
+            manifest.records[new_record.path] = new_record
+        if batch_records and time.monotonic() - last_save >= INGEST_MANIFEST_SAVE_INTERVAL:
+            manifest.save()
+            last_save = time.monotonic()
+        batch_documents.clear()
+        batch_ids.clear()
+        batch_records.clear()
+
+    for filepath, documents in iter_load_files(list(to_ingest), loader=load_and_chunk_file):
+        stat, content_hash = to_ingest[filepath]
+        record = manifest.records.get(filepath)
+        if record and record.chunk_ids:
+            delete_chunks(record.chunk_ids)
+
+        tier = get_data_tier(filepath)
+        chunk_ids = make_chunk_ids(filepath, content_hash, len(documents))
+        for document, chunk_id in zip(documents, chunk_ids):
+            document.metadata["tier"] = tier
+            document.metadata["chunk_id"] = chunk_id
+
+        batch_documents.extend(documents)
+        batch_ids.extend(chunk_ids)
+        batch_records.append(FileRecord(
+            path=filepath,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            content_hash=content_hash,
+            chunk_ids=chunk_ids,
+        ))
+        changed = True
+
+        if len(batch_documents) >= INGEST_BATCH_SIZE:
+            flush()
+    flush()
+
+    if changed or rechunk or not manifest.exists():
+        manifest.save()
+    return changed
@@ -0,0 +1,156 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain.schema import Document
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have",
+    "in", "is", "it", "its", "of", "on", "or", "that", "the", "to", "was", "were",
+    "will", "with", "what", "who", "which", "how", "when", "where", "do", "does",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric terms, without common English stopwords."""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    A persisted inverted index over ingested chunks, scored with Okapi BM25.
+    It lives in a SQLite file next to the vector store and is updated
+    incrementally, chunk by chunk, alongside it. Each chunk keeps its data
+    tier so searches can be restricted to the tiers a user may read.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " chunk_id TEXT PRIMARY KEY, tier TEXT, length INTEGER NOT NULL,"
+            " text TEXT NOT NULL, metadata TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " term TEXT NOT NULL, chunk_id TEXT NOT NULL, tf INTEGER NOT NULL,"
+            " PRIMARY KEY (term, chunk_id));"
+            "CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings (chunk_id);"
+        )
+        self._conn.commit()
+        # Corpus statistics are kept in memory and updated with every change.
+        self._count, self._total_length = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks"
+        ).fetchone()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, chunk_ids: Sequence[str], documents: Sequence[Document]):
+        """Indexes chunks, replacing any already indexed under the same ids."""
+        with self._lock:
+            self._remove(chunk_ids)
+            for chunk_id, document in zip(chunk_ids, documents):
+                terms = Counter(tokenize(document.page_content))
+                length = sum(terms.values())
+                self._conn.execute(
+                    "INSERT INTO chunks (chunk_id, tier, length, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (chunk_id, document.metadata.get("tier"), length,
+                     document.page_content, json.dumps(document.metadata)),
+                )
+                self._conn.executemany(
+                    "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(term, chunk_id, tf) for term, tf in terms.items()],
+                )
+                self._count += 1
+                self._total_length += length
+            self._conn.commit()
+
+    def remove(self, chunk_ids: Iterable[str]):
+        """Removes chunks from the index; unknown ids are ignored."""
+        with self._lock:
+            self._remove(list(chunk_ids))
+            self._conn.commit()
+
+    def _remove(self, chunk_ids: Sequence[str]):
+        for start in range(0, len(chunk_ids), 500):
+            batch = list(chunk_ids[start:start + 500])
+            placeholders = ",".join("?" * len(batch))
+            count, length = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks WHERE chunk_id IN ({placeholders})", batch
+            ).fetchone()
+            if not count:
+                continue
+            self._conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})", batch)
+            self._count -= count
+            self._total_length -= length
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.commit()
+            self._count, self._total_length = 0, 0
+
+    def search(self, query: str, k: int = 4, tiers: Optional[Sequence[str]] = None) -> List[Tuple[Document, float]]:
+        """
+        Returns up to k (document, score) pairs ranked by BM25, restricted
+        to chunks of the given tiers when tiers is set.
+        """
+        terms = sorted(set(tokenize(query)))
+        if not terms or not self._count:
+            return []
+
+        with self._lock:
+            term_placeholders = ",".join("?" * len(terms))
+            document_frequency = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({term_placeholders}) GROUP BY term", terms
+            ).fetchall())
+
+            sql = (
+                "SELECT p.chunk_id, p.term, p.tf, c.length FROM postings p "
+                f"JOIN chunks c ON c.chunk_id = p.chunk_id WHERE p.term IN ({term_placeholders})"
+            )
+            params = list(terms)
+            if tiers is not None:
+                sql += f" AND c.tier IN ({','.join('?' * len(tiers))})"
+                params.extend(tiers)
+            rows = self._conn.execute(sql, params).fetchall()
+
+            average_length = self._total_length / self._count or 1.0
+            scores: Dict[str, float] = {}
+            for chunk_id, term, tf, length in rows:
+                df = document_frequency[term]
+                idf = math.log(1 + (self._count - df + 0.5) / (df + 0.5))
+                norm = tf + self.k1 * (1 - self.b + self.b * length / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            if not top:
+                return []
+            top_ids = [chunk_id for chunk_id, _ in top]
+            stored = {
+                chunk_id: (text, metadata)
+                for chunk_id, text, metadata in self._conn.execute(
+                    f"SELECT chunk_id, text, metadata FROM chunks WHERE chunk_id IN ({','.join('?' * len(top_ids))})",
+                    top_ids,
+                )
+            }
+
+        results = []
+        for chunk_id, score in top:
+            text, metadata = stored[chunk_id]
+            results.append((Document(page_content=text, metadata=json.loads(metadata), id=chunk_id), score))
+        return results
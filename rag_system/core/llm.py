@@ -1,9 +1,52 @@
+import threading
+
+import httpx
 from langchain_openai import ChatOpenAI
 
-from config.settings import OPENROUTER_API_KEY, BASE_URL, MODEL_NAME
+from core.telemetry import get_callback_handler
+from config.settings import (OPENROUTER_API_KEY, BASE_URL, MODEL_NAME,
+                             LLM_MAX_CONNECTIONS, LLM_KEEPALIVE_EXPIRY,
+                             LLM_TIMEOUT)
+
+_http_client = None
+_http_async_client = None
+_http_client_lock = threading.Lock()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Returns the process-wide HTTP client used for OpenRouter requests.
+    Connections are kept alive and reused across questions, so only the
+    first request pays for the TCP and TLS handshakes.
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(timeout=LLM_TIMEOUT, limits=_limits())
+        return _http_client
+
+
+def get_http_async_client() -> httpx.AsyncClient:
+    """
+    Returns the process-wide async HTTP client, used when the LLM is called
+    with ainvoke/astream (e.g. from the FastAPI server's event loop).
+    """
+    global _http_async_client
+    with _http_client_lock:
+        if _http_async_client is None:
+            _http_async_client = httpx.AsyncClient(timeout=LLM_TIMEOUT, limits=_limits())
+        return _http_async_client
 
 
-def get_llm():
+def get_llm(model_name: str = MODEL_NAME):
     """
     Initializes and returns the ChatOpenRouter LLM.
     """
@@ -11,8 +54,12 @@ def get_llm():
         llm = ChatOpenAI(
             api_key=OPENROUTER_API_KEY,
             base_url=BASE_URL,
-            model=MODEL_NAME,
-            streaming=True
+            model=model_name,
+            streaming=True,
+            http_client=get_http_client(),
+            http_async_client=get_http_async_client(),
+            # Times every call, including time to first token and tokens/sec.
+            callbacks=[get_callback_handler()],
         )
         return llm
     except Exception as e:
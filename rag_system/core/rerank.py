@@ -0,0 +1,135 @@
+import re
+import threading
+from typing import Callable, List, Set
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config.settings import (CONTEXT_TOKEN_BUDGET, DEDUP_SIMILARITY, MMR_LAMBDA,
+                             RERANK_MODEL_NAME, RERANKER, RETRIEVAL_K)
+from core.history import estimate_tokens
+from core.telemetry import span
+
+_WORD_RE = re.compile(r"\w+")
+
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
+
+
+def get_cross_encoder():
+    """Returns the process-wide cross-encoder model, loading it on first use."""
+    global _cross_encoder
+    with _cross_encoder_lock:
+        if _cross_encoder is None:
+            from sentence_transformers import CrossEncoder
+            _cross_encoder = CrossEncoder(RERANK_MODEL_NAME)
+        return _cross_encoder
+
+
+def _shingles(text: str, size: int = 3) -> Set[tuple]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def deduplicate(documents: List[Document], threshold: float = DEDUP_SIMILARITY) -> List[Document]:
+    """
+    Drops documents whose word 3-shingles overlap an earlier (higher ranked)
+    document's by at least `threshold` (Jaccard similarity).
+    """
+    kept, kept_shingles = [], []
+    for document in documents:
+        shingles = _shingles(document.page_content)
+        if any(len(shingles & other) / (len(shingles | other) or 1) >= threshold for other in kept_shingles):
+            continue
+        kept.append(document)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class Reranker:
+    """
+    The re-ranking stage between retrieval and the LLM. A wide candidate set
+    is deduplicated, re-ordered on CPU and cut down to the top_n documents
+    that fit in context_token_budget (estimated tokens). Methods:
+
+    - "mmr": maximal marginal relevance over the (cached) chunk embeddings,
+      trading relevance to the query against diversity with mmr_lambda.
+    - "cross-encoder": scores each (query, chunk) pair with a small
+      sentence-transformers cross-encoder.
+    - "none": keeps the retrieval order.
+    """
+
+    def __init__(self, embeddings, method: str = RERANKER, top_n: int = RETRIEVAL_K,
+                 context_token_budget: int = CONTEXT_TOKEN_BUDGET, mmr_lambda: float = MMR_LAMBDA,
+                 dedup_threshold: float = DEDUP_SIMILARITY,
+                 token_counter: Callable[[str], int] = estimate_tokens):
+        if method not in ("mmr", "cross-encoder", "none"):
+            raise ValueError(f"Unknown reranker '{method}'")
+        self.embeddings = embeddings
+        self.method = method
+        self.top_n = top_n
+        self.context_token_budget = context_token_budget
+        self.mmr_lambda = mmr_lambda
+        self.dedup_threshold = dedup_threshold
+        self.token_counter = token_counter
+
+    def _mmr(self, query: str, documents: List[Document]) -> List[Document]:
+        query_vector = _normalize(np.asarray(self.embeddings.embed_query(query), dtype=np.float32))
+        document_vectors = _normalize(np.asarray(
+            self.embeddings.embed_documents([document.page_content for document in documents]), dtype=np.float32
+        ))
+        relevance = document_vectors @ query_vector
+        similarity = document_vectors @ document_vectors.T
+
+        selected: List[int] = []
+        remaining = list(range(len(documents)))
+        while remaining:
+            if selected:
+                redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+            else:
+                redundancy = np.zeros(len(remaining))
+            scores = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * redundancy
+            best = remaining[int(np.argmax(scores))]
+            selected.append(best)
+            remaining.remove(best)
+        return [documents[i] for i in selected]
+
+    def _cross_encode(self, query: str, documents: List[Document]) -> List[Document]:
+        with span("cross_encode", documents=len(documents)):
+            scores = get_cross_encoder().predict([(query, document.page_content) for document in documents])
+        order = np.argsort(-np.asarray(scores))
+        return [documents[i] for i in order]
+
+    def rerank(self, query: str, documents: List[Document]) -> List[Document]:
+        """Returns the documents to pass to the LLM, best first."""
+        documents = deduplicate(documents, self.dedup_threshold)
+        if len(documents) > 1:
+            if self.method == "mmr":
+                documents = self._mmr(query, documents)
+            elif self.method == "cross-encoder":
+                documents = self._cross_encode(query, documents)
+
+        selected, used_tokens = [], 0
+        for document in documents:
+            if len(selected) >= self.top_n:
+                break
+            tokens = self.token_counter(document.page_content)
+            # The best document is always kept, even if it alone exceeds the budget.
+            if selected and used_tokens + tokens > self.context_token_budget:
+                continue
+            selected.append(document)
+            used_tokens += tokens
+        return selected
+
+
+def count_context_tokens(documents: List[Document], token_counter: Callable[[str], int] = estimate_tokens) -> int:
+    """Estimated tokens of the documents that are stuffed into the prompt."""
+    return sum(token_counter(document.page_content) for document in documents)
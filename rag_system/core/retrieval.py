@@ -1,86 +1,528 @@
-from typing import List, Dict, Any
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Tuple, Union
 
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 
+from core.answer_cache import SemanticAnswerCache
+from core.history import ChatHistoryWindow
 from core.llm import get_llm
-from core.vectorstore import create_or_load_vectorstore
+from core.rerank import Reranker, count_context_tokens
+from core.rewrite import QuestionRewriter
+from core.telemetry import record_timings, span
+from core.vectorstore import (get_corpus_version, get_lexical_index,
+                              open_vectorstore, refresh_vectorstore)
+from config.settings import (CORPUS_REFRESH_INTERVAL, DATA_TIERS, HISTORY_SUMMARIZE,
+                             HYBRID_RETRIEVAL, MODEL_NAME, RETRIEVAL_FETCH_K,
+                             REWRITE_MODEL_NAME, RRF_K)
 from users.schema import User
-from utils.file_io import load_documents_from_directories
-from core.access_control import get_accessible_directories
+from core.access_control import get_access_policy
 
-def run_rag_pipeline(user: User, question: str, embeddings, chat_history: List[Dict[str, str]]) -> Dict[str, Any]:
+# Answering prompt
+QA_SYSTEM_PROMPT = (
+    "You are InnovateX's Corporate Information Assistant, a friendly and accurate AI. "
+    "Your primary role is to provide precise answers based *only* on the retrieved context, "
+    "acting as a helpful and engaging conversational partner. "
+    "Always start by greeting the user and offering help. "
+    "If the context does not contain the answer, politely state that you don't have enough information. "
+    "Ensure your responses are concise, clear, and relevant to the user's query, always maintaining a professional and helpful tone. "
+    "Use markdown for formatting when appropriate (e.g., bullet points for lists, bold for emphasis)."
+    "\n\n"
+    "{context}"
+)
+
+
+@dataclass
+class RetrievalEvent:
+    """Emitted once, as soon as the context documents have been retrieved."""
+    documents: List[Document]
+
+
+@dataclass
+class TokenEvent:
+    """Emitted for every chunk of answer text produced by the LLM."""
+    text: str
+
+
+@dataclass
+class DoneEvent:
+    """Emitted last, with the full answer and stage timings in seconds."""
+    answer: str
+    documents: List[Document]
+    timings: Dict[str, float] = field(default_factory=dict)
+    # True when the answer was served from the semantic answer cache.
+    cached: bool = False
+    # The question retrieval was run with, after any rewriting.
+    standalone_question: str = ""
+    # Estimated tokens of chat history sent to the LLM, and left out of it.
+    history_tokens: int = 0
+    dropped_history_tokens: int = 0
+    # Estimated tokens of the retrieved context sent to the LLM.
+    context_tokens: int = 0
+
+
+PipelineEvent = Union[RetrievalEvent, TokenEvent, DoneEvent]
+
+
+def document_key(document: Document) -> str:
+    """A stable identity for a retrieved chunk, used to merge result lists."""
+    chunk_id = document.metadata.get("chunk_id") or document.id
+    if chunk_id:
+        return chunk_id
+    metadata = document.metadata
+    return f"{metadata.get('source')}:{metadata.get('row')}:{metadata.get('chunk_index')}:{metadata.get('start_index')}"
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int = RRF_K) -> List[Document]:
+    """
+    Merges ranked result lists by reciprocal rank fusion: each document
+    scores the sum of 1 / (k + rank) over the lists it appears in.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, document in enumerate(results, start=1):
+            key = document_key(document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, document)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class VectorRetriever(BaseRetriever):
+    """
+    Retrieves from the vector store alone, restricted to the given tiers.
+    Searches are timed as the same vector_search span as in hybrid retrieval.
+    """
+    vector_store: Any
+    tier_filter: Dict[str, Any]
+    k: int = RETRIEVAL_FETCH_K
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with span("vector_search", k=self.k):
+            return self.vector_store.similarity_search(query, k=self.k, filter=self.tier_filter)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves from the vector store and the BM25 lexical index, both
+    restricted to the same tiers, and fuses the two rankings.
+    """
+    vector_store: Any
+    lexical_index: Any
+    tiers: List[str]
+    tier_filter: Dict[str, Any]
+    k: int = RETRIEVAL_FETCH_K
+    rrf_k: int = RRF_K
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with span("vector_search", k=self.k):
+            dense = self.vector_store.similarity_search(query, k=self.k, filter=self.tier_filter)
+        with span("lexical_search", k=self.k):
+            lexical = [document for document, _ in self.lexical_index.search(query, k=self.k, tiers=self.tiers)]
+        return reciprocal_rank_fusion([dense, lexical], self.rrf_k)[:self.k]
+
+
+class SharedCorpus:
+    """
+    The shared vector store, kept in sync with the data directories.
+    Changes on disk are picked up at most every CORPUS_REFRESH_INTERVAL seconds.
+    """
+
+    def __init__(self, embeddings, refresh_interval: float = CORPUS_REFRESH_INTERVAL):
+        self.embeddings = embeddings
+        self.refresh_interval = refresh_interval
+        self.vector_store = open_vectorstore(embeddings)
+        self.lexical_index = get_lexical_index()
+        self._lock = threading.Lock()
+        self._last_refresh = None
+        # Fingerprint of the ingested corpus; cached answers are tied to it.
+        self.version = None
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Re-syncs the vector store with the data directories if it is due.
+        While one caller is re-syncing, other (non-forced) callers return
+        at once and query the index as it is, instead of waiting for the
+        ingestion to finish.
+        """
+        if not self._lock.acquire(blocking=force):
+            return False
+        try:
+            now = time.monotonic()
+            if not force and self._last_refresh is not None and now - self._last_refresh < self.refresh_interval:
+                return False
+            self._last_refresh = now
+            changed = refresh_vectorstore(self.vector_store, list(DATA_TIERS.values()))
+            if changed or self.version is None:
+                self.version = get_corpus_version()
+            return changed
+        finally:
+            self._lock.release()
+
+
+# Runs retrieval with the raw question while the rewrite LLM call is in flight.
+_speculative_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculative-retrieval")
+
+
+class RagPipeline:
+    """
+    The RAG pipeline for one access scope (a set of data tiers). It is
+    built once and reused for every question asked within that scope.
+    """
+
+    def __init__(self, tiers: Tuple[str, ...], corpus: SharedCorpus, llm, rewriter: QuestionRewriter,
+                 reranker: Optional[Reranker] = None):
+        self.tiers = tiers
+        self.corpus = corpus
+        self.llm = llm
+        self.rewriter = rewriter
+        self.reranker = reranker or Reranker(corpus.embeddings)
+        self.policy = get_access_policy()
+
+        # The whole corpus lives in one shared store; the tier filter limits
+        # retrieval to what the scope may read.
+        tier_filter = self.policy.metadata_filter(tiers)
+        if HYBRID_RETRIEVAL:
+            self.retriever = HybridRetriever(
+                vector_store=corpus.vector_store,
+                lexical_index=corpus.lexical_index,
+                tiers=list(tiers),
+                tier_filter=tier_filter,
+            )
+        else:
+            self.retriever = VectorRetriever(vector_store=corpus.vector_store, tier_filter=tier_filter)
+
+        qa_prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", QA_SYSTEM_PROMPT),
+                MessagesPlaceholder("chat_history"),
+                ("human", "{input}"),
+            ]
+        )
+        self.answer_chain = create_stuff_documents_chain(llm, qa_prompt)
+
+    def rewrite(self, question: str, chat_history: list,
+                timings: Dict[str, float]) -> Tuple[str, Optional[Future]]:
+        """
+        Runs the rewrite stage for a question, given LangChain chat messages.
+        Returns the standalone question and, when retrieval with the raw
+        question was started speculatively alongside the rewrite, its future.
+        """
+        if not self.rewriter.should_rewrite(question, chat_history):
+            return question, None
+        start = time.perf_counter()
+        speculative = None
+        if self.rewriter.speculative:
+            speculative = _speculative_executor.submit(self.retriever.invoke, question)
+        standalone_question = self.rewriter.rewrite(question, chat_history)
+        timings["rewrite"] = time.perf_counter() - start
+        return standalone_question, speculative
+
+    def search(self, question: str, standalone_question: str, speculative: Optional[Future],
+               timings: Dict[str, float]) -> List[Document]:
+        """
+        Retrieves and re-ranks the candidate set for a rewritten question,
+        reusing the speculative results for the raw question if they fit.
+        """
+        retrieval_start = time.perf_counter()
+        if speculative and self.rewriter.can_reuse(question, standalone_question):
+            candidates = speculative.result()
+        else:
+            if speculative:
+                speculative.cancel()
+            candidates = self.retriever.invoke(standalone_question)
+
+        # Defense in depth: drop anything the store filter should have excluded.
+        candidates = self.policy.authorize_documents(candidates, self.tiers)
+        rerank_start = time.perf_counter()
+        timings["retrieval"] = rerank_start - retrieval_start
+        documents = self.reranker.rerank(standalone_question, candidates)
+        timings["rerank"] = time.perf_counter() - rerank_start
+        return documents
+
+    def retrieve(self, question: str, chat_history: list, timings: Dict[str, float]) -> Tuple[List[Document], str]:
+        """
+        Runs the rewrite stage, retrieval of the candidate set and re-ranking
+        for a question, given LangChain chat messages. Returns the documents
+        for the LLM and the question they were retrieved with, and records
+        the latency of each stage.
+        """
+        standalone_question, speculative = self.rewrite(question, chat_history, timings)
+        return self.search(question, standalone_question, speculative, timings), standalone_question
+
+    async def arewrite(self, question: str, chat_history: list,
+                       timings: Dict[str, float]) -> Tuple[str, Optional[asyncio.Future]]:
+        """Async variant of rewrite; the rewrite is awaited on the event loop."""
+        if not self.rewriter.should_rewrite(question, chat_history):
+            return question, None
+        start = time.perf_counter()
+        speculative = None
+        if self.rewriter.speculative:
+            speculative = asyncio.ensure_future(asyncio.to_thread(self.retriever.invoke, question))
+        standalone_question = await self.rewriter.arewrite(question, chat_history)
+        timings["rewrite"] = time.perf_counter() - start
+        return standalone_question, speculative
+
+    async def asearch(self, question: str, standalone_question: str, speculative: Optional[asyncio.Future],
+                      timings: Dict[str, float]) -> List[Document]:
+        """
+        Async variant of search. The blocking vector store, BM25 and
+        re-ranking work runs in the default executor.
+        """
+        retrieval_start = time.perf_counter()
+        if speculative and self.rewriter.can_reuse(question, standalone_question):
+            candidates = await speculative
+        else:
+            if speculative:
+                speculative.cancel()
+            candidates = await asyncio.to_thread(self.retriever.invoke, standalone_question)
+
+        candidates = self.policy.authorize_documents(candidates, self.tiers)
+        rerank_start = time.perf_counter()
+        timings["retrieval"] = rerank_start - retrieval_start
+        documents = await asyncio.to_thread(self.reranker.rerank, standalone_question, candidates)
+        timings["rerank"] = time.perf_counter() - rerank_start
+        return documents
+
+    async def aretrieve(self, question: str, chat_history: list,
+                        timings: Dict[str, float]) -> Tuple[List[Document], str]:
+        """Async variant of retrieve."""
+        standalone_question, speculative = await self.arewrite(question, chat_history, timings)
+        return await self.asearch(question, standalone_question, speculative, timings), standalone_question
+
+    def new_history_window(self) -> ChatHistoryWindow:
+        """
+        Returns a history window for a new conversation. Callers keep one per
+        conversation so converted messages are reused across turns.
+        """
+        return ChatHistoryWindow(summarizer_llm=self.rewriter.llm if HISTORY_SUMMARIZE else None)
+
+    def _known_rewrite(self, question: str, chat_history: list,
+                       answer_cache: Optional[SemanticAnswerCache]) -> Optional[str]:
+        """
+        The standalone question answer_cache remembers for a follow-up that
+        needs rewriting, so a repeat skips the rewrite LLM call.
+        """
+        if answer_cache is None or not self.rewriter.should_rewrite(question, chat_history):
+            return None
+        return answer_cache.lookup_rewrite(question, chat_history)
+
+    def stream(self, question: str, chat_history: List[Dict[str, str]]) -> Iterator[Dict[str, Any]]:
+        """
+        Streams output chunks ("context" with the retrieved documents, then
+        "answer" tokens) for a question.
+        """
+        for event in self.stream_events(question, chat_history):
+            if isinstance(event, RetrievalEvent):
+                yield {"context": event.documents}
+            elif isinstance(event, TokenEvent):
+                yield {"answer": event.text}
+
+    def stream_events(self, question: str, chat_history: List[Dict[str, str]],
+                      answer_cache: Optional[SemanticAnswerCache] = None,
+                      history_window: Optional[ChatHistoryWindow] = None) -> Iterator[PipelineEvent]:
+        """
+        Answers a question in a single execution, emitting a RetrievalEvent
+        with the source documents, then TokenEvents, then a DoneEvent.
+
+        With an answer_cache, the standalone question (after any rewriting,
+        so it no longer depends on earlier turns) is looked up in the cache
+        before retrieval and, on a miss, its answer is stored there
+        afterwards. Questions that need no rewriting are looked up as they
+        are, and the cache remembers rewrites, so a repeated follow-up with
+        the same history makes no LLM call at all. Only the part of chat_history that fits history_window's
+        token budget is sent to the LLM.
+        """
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        answer_parts: List[str] = []
+
+        self.corpus.refresh()
+        timings["refresh"] = time.perf_counter() - start
+
+        window = (history_window or self.new_history_window()).window(chat_history)
+        langchain_chat_history = window.messages
+        standalone_question = self._known_rewrite(question, langchain_chat_history, answer_cache)
+        speculative = None
+        if standalone_question is None:
+            standalone_question, speculative = self.rewrite(question, langchain_chat_history, timings)
+            if answer_cache is not None and "rewrite" in timings:
+                answer_cache.store_rewrite(question, langchain_chat_history, standalone_question)
+        if answer_cache is not None:
+            lookup_start = time.perf_counter()
+            hit = answer_cache.lookup(standalone_question, self.tiers, self.corpus.version)
+            timings["cache_lookup"] = time.perf_counter() - lookup_start
+            if hit:
+                if speculative:
+                    speculative.cancel()
+                for event in _cached_answer_events(hit, standalone_question, timings, start):
+                    yield event
+                return
+
+        documents = self.search(question, standalone_question, speculative, timings)
+        yield RetrievalEvent(documents=documents)
+
+        answer_start = time.perf_counter()
+        for token in self.answer_chain.stream({
+            "input": question,
+            "chat_history": langchain_chat_history,
+            "context": documents,
+        }):
+            if not answer_parts:
+                timings["first_token"] = time.perf_counter() - start
+            answer_parts.append(token)
+            yield TokenEvent(text=token)
+        timings["generation"] = time.perf_counter() - answer_start
+
+        answer = "".join(answer_parts)
+        if answer_cache is not None:
+            answer_cache.store(standalone_question, self.tiers, self.corpus.version, answer, documents)
+
+        timings["total"] = time.perf_counter() - start
+        yield _done_event(answer, documents, timings, standalone_question, window)
+
+    async def astream_events(self, question: str, chat_history: List[Dict[str, str]],
+                             answer_cache: Optional[SemanticAnswerCache] = None,
+                             history_window: Optional[ChatHistoryWindow] = None) -> AsyncIterator[PipelineEvent]:
+        """
+        Async variant of stream_events. Answer tokens are streamed with
+        astream and blocking stages run in the default executor, so many
+        conversations can share one event loop.
+        """
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        answer_parts: List[str] = []
+
+        await asyncio.to_thread(self.corpus.refresh)
+        timings["refresh"] = time.perf_counter() - start
+
+        window = await asyncio.to_thread((history_window or self.new_history_window()).window, chat_history)
+        langchain_chat_history = window.messages
+        standalone_question = self._known_rewrite(question, langchain_chat_history, answer_cache)
+        speculative = None
+        if standalone_question is None:
+            standalone_question, speculative = await self.arewrite(question, langchain_chat_history, timings)
+            if answer_cache is not None and "rewrite" in timings:
+                answer_cache.store_rewrite(question, langchain_chat_history, standalone_question)
+        if answer_cache is not None:
+            lookup_start = time.perf_counter()
+            hit = await asyncio.to_thread(answer_cache.lookup, standalone_question, self.tiers, self.corpus.version)
+            timings["cache_lookup"] = time.perf_counter() - lookup_start
+            if hit:
+                if speculative:
+                    speculative.cancel()
+                for event in _cached_answer_events(hit, standalone_question, timings, start):
+                    yield event
+                return
+
+        documents = await self.asearch(question, standalone_question, speculative, timings)
+        yield RetrievalEvent(documents=documents)
+
+        answer_start = time.perf_counter()
+        async for token in self.answer_chain.astream({
+            "input": question,
+            "chat_history": langchain_chat_history,
+            "context": documents,
+        }):
+            if not answer_parts:
+                timings["first_token"] = time.perf_counter() - start
+            answer_parts.append(token)
+            yield TokenEvent(text=token)
+        timings["generation"] = time.perf_counter() - answer_start
+
+        answer = "".join(answer_parts)
+        if answer_cache is not None:
+            await asyncio.to_thread(answer_cache.store, standalone_question, self.tiers, self.corpus.version,
+                                    answer, documents)
+
+        timings["total"] = time.perf_counter() - start
+        yield _done_event(answer, documents, timings, standalone_question, window)
+
+
+def _cached_answer_events(hit, question: str, timings: Dict[str, float], start: float) -> List[PipelineEvent]:
+    timings["total"] = time.perf_counter() - start
+    record_timings("rag", timings)
+    return [
+        RetrievalEvent(documents=hit.documents),
+        TokenEvent(text=hit.answer),
+        DoneEvent(answer=hit.answer, documents=hit.documents, timings=timings,
+                  cached=True, standalone_question=question),
+    ]
+
+
+def _done_event(answer: str, documents: List[Document], timings: Dict[str, float],
+                standalone_question: str, window) -> DoneEvent:
+    record_timings("rag", timings)
+    return DoneEvent(answer=answer, documents=documents, timings=timings,
+                     standalone_question=standalone_question,
+                     history_tokens=window.kept_tokens + window.summary_tokens,
+                     dropped_history_tokens=window.dropped_tokens,
+                     context_tokens=count_context_tokens(documents))
+
+
+_corpus: Optional[SharedCorpus] = None
+_pipelines: Dict[Tuple[str, ...], RagPipeline] = {}
+_registry_lock = threading.Lock()
+
+
+def get_rag_pipeline(user: User, embeddings) -> Optional[RagPipeline]:
+    """
+    Returns the process-wide RagPipeline for the user's access scope,
+    building it (and the shared corpus) on first use. Roles that can read
+    the same tiers share one pipeline. Returns None for a role that cannot
+    read any tier.
+    """
+    global _corpus
+    tiers = tuple(get_access_policy().tiers(user.role))
+    if not tiers:
+        print(f"Role '{user.role}' has no accessible data tiers.")
+        return None
+    with _registry_lock:
+        pipeline = _pipelines.get(tiers)
+        if pipeline:
+            return pipeline
+
+        try:
+            if _corpus is None:
+                _corpus = SharedCorpus(embeddings)
+        except Exception as e:
+            print(f"Error creating/loading vector store: {e}")
+            return None
+
+        llm = get_llm()
+        if not llm:
+            return None
+        # Follow-up questions may be rewritten by a smaller, faster model.
+        rewrite_llm = get_llm(REWRITE_MODEL_NAME) if REWRITE_MODEL_NAME != MODEL_NAME else llm
+        if not rewrite_llm:
+            return None
+
+        pipeline = RagPipeline(tiers, _corpus, llm, QuestionRewriter(rewrite_llm))
+        _pipelines[tiers] = pipeline
+        return pipeline
+
+
+def run_rag_pipeline(user: User, question: str, embeddings, chat_history: List[Dict[str, str]]) -> Iterator[Dict[str, Any]]:
     """
     Runs the RAG pipeline for a given user, question, and chat history.
     """
-    accessible_dirs = get_accessible_directories(user)
-    documents = load_documents_from_directories(accessible_dirs)
-
-    if not documents:
-        return {"answer": "No documents accessible to the user.", "source_documents": []}
-
-    vector_store = create_or_load_vectorstore(documents, embeddings, user.role)
-    retriever = vector_store.as_retriever()
-
-    llm = get_llm()
-    if not llm:
-        return {"answer": "LLM could not be initialized.", "source_documents": []}
-
-    # Contextualize question prompt
-    contextualize_q_system_prompt = (
-        "Given a chat history and the latest user question "
-        "which might reference context in the chat history, "
-        "formulate a standalone question which can be understood "
-        "without the chat history. Do NOT answer the question, "
-        "just reformulate it if needed and otherwise return it as is."
-    )
-    contextualize_q_prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", contextualize_q_system_prompt),
-            MessagesPlaceholder("chat_history"),
-            ("human", "{input}"),
-        ]
-    )
-    history_aware_retriever = create_history_aware_retriever(
-        llm, retriever, contextualize_q_prompt
-    )
-
-    # Answering prompt
-    qa_system_prompt = (
-        "You are InnovateX's Corporate Information Assistant, a friendly and accurate AI. "
-        "Your primary role is to provide precise answers based *only* on the retrieved context, "
-        "acting as a helpful and engaging conversational partner. "
-        "Always start by greeting the user and offering help. "
-        "If the context does not contain the answer, politely state that you don't have enough information. "
-        "Ensure your responses are concise, clear, and relevant to the user's query, always maintaining a professional and helpful tone. "
-        "Use markdown for formatting when appropriate (e.g., bullet points for lists, bold for emphasis)."
-        "\n\n"
-        "{context}"
-    )
-    qa_prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", qa_system_prompt),
-            MessagesPlaceholder("chat_history"),
-            ("human", "{input}"),
-        ]
-    )
-    
-    question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
-    
-    rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
-
-    # Convert chat history format
-    langchain_chat_history = []
-    for message in chat_history:
-        if message["role"] == "user":
-            langchain_chat_history.append(HumanMessage(content=message["content"]))
-        elif message["role"] == "assistant":
-            langchain_chat_history.append(AIMessage(content=message["content"]))
+    if not get_access_policy().tiers(user.role):
+        return iter([{"answer": "No documents accessible to the user.", "context": []}])
+
+    pipeline = get_rag_pipeline(user, embeddings)
+    if not pipeline:
+        return iter([{"answer": "RAG pipeline could not be initialized.", "context": []}])
 
     try:
-        return rag_chain.stream({"input": question, "chat_history": langchain_chat_history})
+        return pipeline.stream(question, chat_history)
     except Exception as e:
         print(f"Error during RAG pipeline execution: {e}")
         return iter([{"answer": "An error occurred while generating the answer.", "context": []}])
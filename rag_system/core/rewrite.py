@@ -0,0 +1,110 @@
+import re
+from typing import List, Set
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from config.settings import (REWRITE_MODE, REWRITE_REUSE_SIMILARITY,
+                             REWRITE_SPECULATIVE)
+
+# Contextualize question prompt
+CONTEXTUALIZE_Q_SYSTEM_PROMPT = (
+    "Given a chat history and the latest user question "
+    "which might reference context in the chat history, "
+    "formulate a standalone question which can be understood "
+    "without the chat history. Do NOT answer the question, "
+    "just reformulate it if needed and otherwise return it as is."
+)
+
+# Words that usually point back at earlier turns of the conversation.
+REFERENTIAL_WORDS = {
+    "it", "its", "it's", "they", "them", "their", "theirs", "this", "that",
+    "these", "those", "he", "him", "his", "she", "her", "hers", "there",
+    "above", "previous", "earlier", "former", "latter", "same", "else",
+    "again", "more", "another", "other", "one", "ones",
+}
+FOLLOW_UP_OPENERS = ("and ", "but ", "also ", "what about", "how about", "why not", "so ")
+MIN_SELF_CONTAINED_WORDS = 4
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def word_set_similarity(a: str, b: str) -> float:
+    """Jaccard similarity of the word sets of two strings."""
+    words_a: Set[str] = set(_words(a))
+    words_b: Set[str] = set(_words(b))
+    if not words_a and not words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def is_self_contained(question: str) -> bool:
+    """
+    Cheap local check for follow-up questions that can be understood
+    without the chat history, so the rewrite LLM call can be skipped.
+    """
+    words = _words(question)
+    if len(words) < MIN_SELF_CONTAINED_WORDS:
+        return False
+    if question.strip().lower().startswith(FOLLOW_UP_OPENERS):
+        return False
+    return not REFERENTIAL_WORDS.intersection(words)
+
+
+class QuestionRewriter:
+    """
+    The question rewriting stage in front of retrieval. It turns a
+    follow-up question into a standalone one with an LLM call, unless
+    `mode` says otherwise:
+
+    - "auto": skip the call when the question looks self-contained.
+    - "always": rewrite every follow-up question.
+    - "never": always retrieve with the raw question.
+
+    With `speculative` set, the pipeline retrieves with the raw question in
+    parallel with the rewrite and keeps those results when the rewritten
+    question has a word similarity of at least `reuse_similarity`.
+    """
+
+    def __init__(self, llm, mode: str = REWRITE_MODE, speculative: bool = REWRITE_SPECULATIVE,
+                 reuse_similarity: float = REWRITE_REUSE_SIMILARITY):
+        if mode not in ("auto", "always", "never"):
+            raise ValueError(f"Unknown rewrite mode '{mode}'")
+        self.llm = llm
+        self.mode = mode
+        self.speculative = speculative
+        self.reuse_similarity = reuse_similarity
+
+        contextualize_q_prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", CONTEXTUALIZE_Q_SYSTEM_PROMPT),
+                MessagesPlaceholder("chat_history"),
+                ("human", "{input}"),
+            ]
+        )
+        self.chain = contextualize_q_prompt | llm | StrOutputParser()
+
+    def should_rewrite(self, question: str, chat_history: list) -> bool:
+        if not chat_history or self.mode == "never":
+            return False
+        if self.mode == "always":
+            return True
+        return not is_self_contained(question)
+
+    def rewrite(self, question: str, chat_history: list) -> str:
+        """Returns the standalone form of a question, given LangChain messages."""
+        rewritten = self.chain.invoke({"input": question, "chat_history": chat_history}).strip()
+        return rewritten or question
+
+    async def arewrite(self, question: str, chat_history: list) -> str:
+        """Async variant of rewrite."""
+        rewritten = (await self.chain.ainvoke({"input": question, "chat_history": chat_history})).strip()
+        return rewritten or question
+
+    def can_reuse(self, question: str, rewritten: str) -> bool:
+        """Whether results retrieved for the raw question also fit the rewrite."""
+        return word_set_similarity(question, rewritten) >= self.reuse_similarity
@@ -0,0 +1,270 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config.settings import TELEMETRY_ENABLED, TELEMETRY_WINDOW
+
+METRIC_PREFIX = "rag_"
+QUANTILES = (0.5, 0.9, 0.99)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+@dataclass
+class Span:
+    """A timed unit of work, e.g. a vector search or an LLM call."""
+    name: str
+    start: float
+    duration: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+class Distribution:
+    """Count and sum of all observations, and the most recent ones for quantiles."""
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.total = 0.0
+        self._recent: Deque[float] = deque(maxlen=window)
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self._recent.append(value)
+
+    def quantile(self, q: float) -> float:
+        if not self._recent:
+            return 0.0
+        ordered = sorted(self._recent)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class TelemetryCollector:
+    """
+    In-process metrics store. Spans and other observations are kept as
+    distributions (count, sum and quantiles over the last `window` values),
+    alongside plain counters, and can be rendered in the Prometheus text
+    format. Exporters are called with every finished span.
+    """
+
+    def __init__(self, window: int = TELEMETRY_WINDOW, enabled: bool = TELEMETRY_ENABLED):
+        self.window = window
+        self.enabled = enabled
+        self.exporters: List[Callable[[Span], None]] = []
+        self._distributions: Dict[Tuple[str, Labels], Distribution] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, metric: str, value: float, **labels: str):
+        if not self.enabled:
+            return
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            distribution = self._distributions.get(key)
+            if distribution is None:
+                distribution = self._distributions[key] = Distribution(self.window)
+            distribution.add(value)
+
+    def increment(self, metric: str, value: float = 1.0, **labels: str):
+        if not self.enabled:
+            return
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def finish(self, span: Span):
+        """Records a finished span and hands it to the exporters."""
+        if not self.enabled:
+            return
+        self.observe("span_duration_seconds", span.duration, span=span.name)
+        if span.error:
+            self.increment("span_errors_total", span=span.name)
+        for exporter in self.exporters:
+            try:
+                exporter(span)
+            except Exception as e:
+                print(f"Error exporting span '{span.name}': {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current counters and distribution summaries (p50/p90/p99), keyed by metric."""
+        with self._lock:
+            distributions = {
+                _series_name(metric, labels): {
+                    "count": distribution.count,
+                    "sum": distribution.total,
+                    **{f"p{int(q * 100)}": distribution.quantile(q) for q in QUANTILES},
+                }
+                for (metric, labels), distribution in self._distributions.items()
+            }
+            counters = {_series_name(metric, labels): value for (metric, labels), value in self._counters.items()}
+        return {"distributions": distributions, "counters": counters}
+
+    def render_prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for metric in sorted({metric for metric, _ in self._distributions}):
+                name = METRIC_PREFIX + metric
+                lines.append(f"# TYPE {name} summary")
+                for (series_metric, labels), distribution in sorted(self._distributions.items()):
+                    if series_metric != metric:
+                        continue
+                    for q in QUANTILES:
+                        lines.append(f"{name}{_format_labels(labels + (('quantile', str(q)),))} {distribution.quantile(q)}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {distribution.total}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {distribution.count}")
+            for metric in sorted({metric for metric, _ in self._counters}):
+                name = METRIC_PREFIX + metric
+                lines.append(f"# TYPE {name} counter")
+                for (series_metric, labels), value in sorted(self._counters.items()):
+                    if series_metric == metric:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._distributions.clear()
+            self._counters.clear()
+
+
+def _series_name(metric: str, labels: Labels) -> str:
+    return metric + _format_labels(labels)
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+_collector = TelemetryCollector()
+
+
+def get_collector() -> TelemetryCollector:
+    return _collector
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Times the enclosed block as a span; attributes can be added while it runs."""
+    current = Span(name=name, start=time.time(), attributes=attributes)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        _collector.finish(current)
+
+
+def record_timings(prefix: str, timings: Dict[str, float]):
+    """Records stage timings (in seconds) measured elsewhere, e.g. a pipeline's."""
+    for stage, seconds in timings.items():
+        _collector.observe("stage_duration_seconds", seconds, stage=f"{prefix}.{stage}")
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler that turns LLM, tool and retriever runs into
+    spans. LLM calls also record time to first token, generated tokens
+    and tokens per second.
+    """
+
+    def __init__(self, collector: Optional[TelemetryCollector] = None):
+        self.collector = collector or _collector
+        self._runs: Dict[UUID, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, name: str, **extra: Any):
+        with self._lock:
+            self._runs[run_id] = {"name": name, "start": time.time(), "perf": time.perf_counter(),
+                                  "tokens": 0, "first_token": None, **extra}
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        run["duration"] = time.perf_counter() - run["perf"]
+        self.collector.finish(Span(
+            name=run["name"],
+            start=run["start"],
+            duration=run["duration"],
+            attributes={key: value for key, value in run.items() if key not in ("name", "start", "perf")},
+            error=type(error).__name__ if error else None,
+        ))
+        return run
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, "llm", model=_model_name(serialized, kwargs))
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, "llm", model=_model_name(serialized, kwargs))
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        run = self._runs.get(run_id)
+        if run is None:
+            return
+        if run["first_token"] is None:
+            run["first_token"] = time.perf_counter() - run["perf"]
+            self.collector.observe("llm_time_to_first_token_seconds", run["first_token"], model=run["model"])
+        run["tokens"] += 1
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any):
+        run = self._runs.get(run_id)
+        if run is not None and not run["tokens"]:
+            # Not streamed: fall back to the provider's reported usage.
+            usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+            run["tokens"] = usage.get("completion_tokens", 0)
+        run = self._end(run_id)
+        if run is None:
+            return
+        self.collector.increment("llm_tokens_total", run["tokens"], model=run["model"])
+        generation_time = run["duration"] - (run["first_token"] or 0.0)
+        if run["tokens"] > 1 and generation_time > 0:
+            self.collector.observe("llm_tokens_per_second", run["tokens"] / generation_time, model=run["model"])
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, f"tool.{(serialized or {}).get('name') or kwargs.get('name', 'unknown')}")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error)
+
+    def on_retriever_start(self, serialized: Dict[str, Any], query: str, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, "retriever")
+
+    def on_retriever_end(self, documents: Any, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error)
+
+
+def _model_name(serialized: Dict[str, Any], kwargs: Dict[str, Any]) -> str:
+    params = kwargs.get("invocation_params") or {}
+    return str(params.get("model_name") or params.get("model") or (serialized or {}).get("name") or "unknown")
+
+
+_callback_handler = TelemetryCallbackHandler()
+
+
+def get_callback_handler() -> TelemetryCallbackHandler:
+    """The process-wide callback handler feeding the shared collector."""
+    return _callback_handler
@@ -1,27 +1,106 @@
-from typing import List
+import os
+import re
+import threading
+from typing import List, Optional
 
-from langchain.schema import Document
-from langchain_community.vectorstores import Chroma
 from langchain_core.embeddings import Embeddings
 
-from config.settings import VECTOR_STORE_DIR
+from config.settings import DATA_TIERS, LEXICAL_INDEX_PATH, SCENARIO_VECTOR_STORE_DIR, VECTOR_STORE_DIR
+from core.ingestion import IngestionManifest, sync_vectorstore
+from core.lexical_index import BM25Index
 
+_lexical_index: Optional[BM25Index] = None
+_lexical_index_lock = threading.Lock()
+# Serializes opening the store and manifest load -> sync -> save; concurrent
+# syncs would otherwise overwrite each other's manifest records, and
+# chromadb's client setup is not thread-safe either.
+_store_lock = threading.RLock()
 
-def create_or_load_vectorstore(documents: List[Document], embeddings: Embeddings, user_role: str):
+
+def get_lexical_index() -> BM25Index:
     """
-    Creates a new ChromaDB vector store or loads an existing one
-    based on the user's role.
+    Returns the process-wide BM25 index kept alongside the vector store.
     """
-    # Each role gets a separate vector store to maintain data separation.
-    persist_directory = f"{VECTOR_STORE_DIR}_{user_role}"
-    
-    try:
-        vector_store = Chroma.from_documents(
-            documents=documents,
-            embedding=embeddings,
+    global _lexical_index
+    with _lexical_index_lock:
+        if _lexical_index is None:
+            _lexical_index = BM25Index(LEXICAL_INDEX_PATH)
+        return _lexical_index
+
+
+def open_vectorstore(embeddings: Embeddings, persist_directory: str = VECTOR_STORE_DIR):
+    """
+    Opens a persisted ChromaDB vector store (the shared corporate one by
+    default) without ingesting anything.
+    """
+    # Imported lazily; chromadb is slow to import and only needed once
+    # the first question is asked.
+    from langchain_community.vectorstores import Chroma
+
+    with _store_lock:
+        return Chroma(
+            embedding_function=embeddings,
             persist_directory=persist_directory
         )
+
+
+def refresh_vectorstore(vector_store, dir_paths: List[str]) -> bool:
+    """
+    Incrementally ingests the files in dir_paths into the open shared vector
+    store and the lexical index. Files outside the data tier directories
+    are removed from it. Returns True if anything was added, re-embedded or
+    deleted. Syncs are serialized process-wide.
+    """
+    with _store_lock:
+        manifest = IngestionManifest.load(VECTOR_STORE_DIR)
+        return sync_vectorstore(vector_store, manifest, dir_paths, get_lexical_index(),
+                                corpus_roots=list(DATA_TIERS.values()))
+
+
+def get_corpus_version() -> str:
+    """
+    Returns the version fingerprint of the corpus ingested into the store.
+    """
+    return IngestionManifest.load(VECTOR_STORE_DIR).version()
+
+
+def create_or_load_vectorstore(dir_paths: List[str], embeddings: Embeddings):
+    """
+    Opens the shared, persisted ChromaDB vector store and incrementally
+    ingests the files in dir_paths into it. Only added or changed files are
+    embedded; vectors of removed files are deleted.
+
+    The store holds every data tier once; callers restrict retrieval to a
+    user's tiers with AccessPolicy.metadata_filter.
+    """
+    try:
+        vector_store = open_vectorstore(embeddings)
+        refresh_vectorstore(vector_store, dir_paths)
         return vector_store
     except Exception as e:
         print(f"Error creating/loading vector store: {e}")
         return None
+
+
+def get_scenario_store_dir(scenario_id: str) -> str:
+    """The directory of a scenario's own vector store and manifest."""
+    return os.path.join(SCENARIO_VECTOR_STORE_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", scenario_id))
+
+
+def create_or_load_scenario_vectorstore(scenario_id: str, files: List[str], embeddings: Embeddings):
+    """
+    Opens the vector store of a game scenario and syncs the scenario's files
+    into it. Each scenario has a store and manifest of its own, so its files
+    stay out of the shared corporate store and a sync never touches another
+    scenario's chunks. Returns None on failure.
+    """
+    persist_directory = get_scenario_store_dir(scenario_id)
+    try:
+        vector_store = open_vectorstore(embeddings, persist_directory)
+        with _store_lock:
+            manifest = IngestionManifest.load(persist_directory)
+            sync_vectorstore(vector_store, manifest, files, corpus_roots=files)
+        return vector_store
+    except Exception as e:
+        print(f"Error creating/loading vector store for scenario '{scenario_id}': {e}")
+        return None
@@ -1,28 +1,10 @@
-import logging
 import os
-from datetime import datetime
 
-from config.settings import LOGS_DIR
 from core.access_control import authenticate_user
-from core.embeddings import get_embedding_model
-from core.retrieval import run_rag_pipeline
+from utils.interaction_log import (Timer, log_event, log_interaction,
+                                   new_request_id, setup_interaction_logging)
 
 
-def setup_logging(username: str):
-    """Sets up logging for a user session."""
-    log_dir = LOGS_DIR
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-        
-    log_file = os.path.join(log_dir, f"{username}_history.log")
-    
-    logging.basicConfig(
-        filename=log_file,
-        level=logging.INFO,
-        format='%(asctime)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-
 def main():
     """Main function to run the RAG system."""
 
@@ -30,28 +12,45 @@ def main():
     username = input("Enter username: ")
     code = input("Enter code: ")
     
+    setup_interaction_logging()
     user = authenticate_user(username, code)
     
     if not user:
         print("Authentication failed. Invalid username or code.")
+        log_event("auth.failed", channel="cli", user=username)
         return
 
     print(f"Logged in as {user.role}.")
     
     # --- Setup ---
-    setup_logging(user.username)
-    logging.info(f"User '{user.username}' logged in with role '{user.role}'.")
+    # The RAG stack (LangChain, Chroma, sentence-transformers) is imported
+    # only after login, so the prompt appears without waiting for it.
+    from core.embeddings import get_embedding_model
+    from core.answer_cache import SemanticAnswerCache
+    from core.retrieval import DoneEvent, get_rag_pipeline
+
+    log_event("auth.login", channel="cli", user=user.username, role=user.role)
     
     print("Initializing embedding model...")
-    embeddings = get_embedding_model()
+    with Timer() as load_embeddings:
+        embeddings = get_embedding_model()
     if not embeddings:
         print("Could not initialize embedding model. Exiting.")
         return
+
+    with Timer() as load_pipeline:
+        pipeline = get_rag_pipeline(user, embeddings)
+    if not pipeline:
+        print("Could not initialize the RAG pipeline. Exiting.")
+        return
+    log_event("rag.startup", channel="cli", user=user.username, role=user.role,
+              durations_ms={"load_embeddings": load_embeddings.ms, "load_pipeline": load_pipeline.ms})
     
+    # Repeated questions within this session are answered from the cache.
+    answer_cache = SemanticAnswerCache(embeddings)
+
     print("Ready to answer your questions.")
     
-    chat_history = []
-    
     # --- Main Loop ---
     while True:
         question = input("\nAsk a question (or type 'exit' to quit): ")
@@ -59,32 +58,30 @@ def main():
         if question.lower() == 'exit':
             break
             
-        logging.info(f"Question: {question}")
+        request_id = new_request_id()
         
         print("\nThinking...")
-        # Call the RAG pipeline in non-streaming mode for CLI
-        # Temporarily create an empty chat_history list, as the CLI is not designed for conversational memory.
-        # The full conversational memory is implemented in the Streamlit app.
-        result_generator = run_rag_pipeline(user, question, embeddings, [])
-        
-        # Collect the full answer and sources from the generator
-        answer_parts = []
-        source_documents = []
-        for chunk in result_generator:
-            if "answer" in chunk:
-                answer_parts.append(chunk["answer"])
-            if "context" in chunk:
-                source_documents.extend(chunk["context"])
-        
-        answer = "".join(answer_parts)
+        # Each CLI question stands alone; conversational memory is in the Streamlit app.
+        # The final event carries the full answer and its sources.
+        done = None
+        try:
+            for event in pipeline.stream_events(question, [], answer_cache):
+                if isinstance(event, DoneEvent):
+                    done = event
+            if done is None:
+                raise RuntimeError("the pipeline finished without an answer")
+        except Exception as e:
+            print(f"Error during RAG pipeline execution: {e}")
+            log_event("rag.error", request_id=request_id, channel="cli", user=user.username, error=str(e))
+            print("\nAn error occurred while generating the answer.")
+            continue
 
-        # Update chat history (only if we implement CLI conversation later)
-        # chat_history.append({"role": "user", "content": question})
-        # chat_history.append({"role": "assistant", "content": answer})
+        answer = done.answer
+        source_documents = done.documents
+        log_interaction(request_id, "cli", user, question, done)
         
         print("\nAnswer:")
         print(answer)
-        logging.info(f"Answer: {answer}")
 
         if source_documents:
             print("\nSources:")
@@ -96,11 +93,10 @@ def main():
             
             for source in unique_sources:
                 print(f"- {source}")
-                logging.info(f"Source: {source}")
 
 
     print("Session ended. Goodbye!")
-    logging.info("User logged out.")
+    log_event("auth.logout", channel="cli", user=user.username, role=user.role)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,16 @@
+import hashlib
+import json
+import os
+import threading
+import time
 import yaml
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+
+from config.settings import SCENARIO_REFRESH_INTERVAL
+
+# The libyaml-backed loader is much faster; fall back to the pure Python one.
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 class WinCondition(BaseModel):
     type: str
@@ -21,34 +31,100 @@ class Scenario(BaseModel):
     win_conditions: List[WinCondition]
 
 class ScenarioLoader:
-    def __init__(self, scenarios_dir: str = "rag_system/scenarios"):
+    """
+    Loads scenarios from YAML files and keeps an in-memory catalog of them.
+    Parsed scenarios are cached until their file's mtime changes, and the
+    directory is checked for changes at most every `refresh_interval`
+    seconds. The listing is precomputed, together with an ETag for it.
+    """
+
+    def __init__(self, scenarios_dir: str = "rag_system/scenarios",
+                 refresh_interval: float = SCENARIO_REFRESH_INTERVAL):
         self.scenarios_dir = scenarios_dir
+        self.refresh_interval = refresh_interval
+        self._scenarios: Dict[str, Tuple[int, Scenario]] = {}
+        self._files: Dict[str, int] = {}
+        self._summary: List[Dict[str, Any]] = []
+        self._catalog: Tuple[bytes, str] = (b"[]", "")
+        self._last_refresh: Optional[float] = None
+        # Reentrant: refresh holds it while loading scenarios through load_scenario.
+        self._lock = threading.RLock()
+        self.refresh(force=True)
+
+    def _path(self, scenario_id: str) -> str:
+        return f"{self.scenarios_dir}/{scenario_id}.yaml"
 
     def load_scenario(self, scenario_id: str) -> Scenario:
-        """Loads and validates a scenario from a YAML file."""
-        filepath = f"{self.scenarios_dir}/{scenario_id}.yaml"
+        """Loads and validates a scenario from a YAML file, or the cache."""
+        filepath = self._path(scenario_id)
         try:
+            mtime_ns = os.stat(filepath).st_mtime_ns
+            with self._lock:
+                cached = self._scenarios.get(scenario_id)
+            if cached and cached[0] == mtime_ns:
+                return cached[1]
+            # Parsed outside the lock; the cache is only locked to read and update it.
             with open(filepath, 'r') as f:
-                data = yaml.safe_load(f)
-            return Scenario(**data)
+                data = yaml.load(f, Loader=YamlLoader)
+            scenario = Scenario(**data)
+            with self._lock:
+                self._scenarios[scenario_id] = (mtime_ns, scenario)
+            return scenario
         except FileNotFoundError:
             raise ValueError(f"Scenario '{scenario_id}' not found.")
         except Exception as e:
             raise ValueError(f"Error loading or validating scenario '{scenario_id}': {e}")
 
-    def list_scenarios(self) -> List[Dict[str, Any]]:
-        """Lists all available scenarios."""
-        scenarios = []
-        for filename in os.listdir(self.scenarios_dir):
-            if filename.endswith(".yaml"):
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Rebuilds the catalog if a scenario file was added, changed or
+        removed. Returns whether the catalog changed.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_refresh is not None and now - self._last_refresh < self.refresh_interval:
+                return False
+            self._last_refresh = now
+
+            try:
+                files = {
+                    entry.name: entry.stat().st_mtime_ns
+                    for entry in os.scandir(self.scenarios_dir)
+                    if entry.name.endswith(".yaml")
+                }
+            except FileNotFoundError:
+                if force:
+                    print(f"Warning: Scenarios directory not found: {self.scenarios_dir}")
+                files = {}
+            if not force and files == self._files:
+                return False
+
+            summary = []
+            for filename in sorted(files):
                 try:
                     scenario = self.load_scenario(filename.replace(".yaml", ""))
-                    scenarios.append({
+                    summary.append({
                         "id": scenario.id,
                         "name": scenario.name,
                         "description": scenario.description
                     })
                 except ValueError as e:
                     print(f"Warning: Could not load scenario '{filename}': {e}")
-        return scenarios
-import os
+            for scenario_id in [i for i in self._scenarios if f"{i}.yaml" not in files]:
+                del self._scenarios[scenario_id]
+
+            self._files = files
+            self._summary = summary
+            summary_json = json.dumps(summary).encode("utf-8")
+            self._catalog = (summary_json, '"' + hashlib.sha1(summary_json).hexdigest() + '"')
+            return True
+
+    def list_scenarios(self) -> List[Dict[str, Any]]:
+        """Lists all available scenarios."""
+        self.refresh()
+        return self._summary
+
+    def catalog(self) -> Tuple[bytes, str]:
+        """The scenario listing as JSON, and its ETag."""
+        self.refresh()
+        return self._catalog
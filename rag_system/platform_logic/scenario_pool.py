@@ -0,0 +1,147 @@
+import hashlib
+import os
+import threading
+from collections.abc import MutableMapping
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Iterator, Mapping, Optional, Set
+
+from agent.security_agent import SecurityAgent
+from platform_logic.scenario_loader import Scenario, ScenarioLoader
+
+
+class CopyOnWriteFS(MutableMapping):
+    """
+    A session's virtual file system. Reads fall through to the scenario's
+    shared, read-only file snapshot; writes and deletes are recorded in a
+    small per-session overlay, so sessions never copy the snapshot.
+    """
+
+    def __init__(self, base: Mapping[str, str], changes: Optional[Mapping[str, Optional[str]]] = None):
+        self.base = base
+        self._written: Dict[str, str] = {}
+        self._deleted: Set[str] = set()
+        for path, content in (changes or {}).items():
+            if content is None:
+                self._deleted.add(path)
+            else:
+                self._written[path] = content
+
+    def __getitem__(self, path: str) -> str:
+        if path in self._written:
+            return self._written[path]
+        if path in self._deleted:
+            raise KeyError(path)
+        return self.base[path]
+
+    def __setitem__(self, path: str, content: str):
+        self._deleted.discard(path)
+        if self.base.get(path) == content:
+            self._written.pop(path, None)
+        else:
+            self._written[path] = content
+
+    def __delitem__(self, path: str):
+        if path not in self:
+            raise KeyError(path)
+        self._written.pop(path, None)
+        if path in self.base:
+            self._deleted.add(path)
+
+    def __iter__(self) -> Iterator[str]:
+        for path in self.base:
+            if path not in self._deleted and path not in self._written:
+                yield path
+        yield from self._written
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def changes(self) -> Dict[str, Optional[str]]:
+        """The overlay relative to the snapshot; None marks a deleted file."""
+        changes: Dict[str, Optional[str]] = dict(self._written)
+        changes.update({path: None for path in self._deleted})
+        return changes
+
+
+@dataclass
+class ScenarioResources:
+    """Everything sessions of one scenario version share."""
+    scenario: Scenario
+    version: str
+    agent: SecurityAgent
+    files: Mapping[str, str]
+
+
+def read_initial_files(scenario: Scenario) -> Dict[str, str]:
+    """Reads a scenario's initial files into a virtual file system."""
+    virtual_fs = {}
+    for filepath in scenario.initial_state.files:
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                virtual_fs[filepath] = f.read()
+        except FileNotFoundError:
+            print(f"Warning: Initial state file not found: {filepath}")
+    return virtual_fs
+
+
+def scenario_version(scenario: Scenario) -> str:
+    """
+    Fingerprint of a scenario definition and the size and modification
+    time of its initial files; resources are rebuilt when it changes.
+    """
+    digest = hashlib.sha256(scenario.model_dump_json().encode("utf-8"))
+    for filepath in scenario.initial_state.files:
+        try:
+            stat = os.stat(filepath)
+            digest.update(f"{filepath}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+        except OSError:
+            digest.update(f"{filepath}:missing".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ScenarioPool:
+    """
+    Builds the agent (models, retriever, tools, executor) and the file
+    snapshot of each scenario once per scenario version and hands them out
+    to every session of that scenario. Concurrent requests for a scenario
+    that is still being built wait for that single build.
+    """
+
+    def __init__(self, scenario_loader: Optional[ScenarioLoader] = None):
+        self.scenario_loader = scenario_loader or ScenarioLoader()
+        self._resources: Dict[str, ScenarioResources] = {}
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _build_lock(self, scenario_id: str) -> threading.Lock:
+        with self._lock:
+            return self._build_locks.setdefault(scenario_id, threading.Lock())
+
+    def get(self, scenario: Scenario) -> ScenarioResources:
+        """Returns the shared resources for the current version of a scenario."""
+        version = scenario_version(scenario)
+        resources = self._resources.get(scenario.id)
+        if resources and resources.version == version:
+            return resources
+
+        with self._build_lock(scenario.id):
+            resources = self._resources.get(scenario.id)
+            if resources and resources.version == version:
+                return resources
+            resources = ScenarioResources(
+                scenario=scenario,
+                version=version,
+                agent=SecurityAgent(scenario),
+                files=MappingProxyType(read_initial_files(scenario)),
+            )
+            self._resources[scenario.id] = resources
+            return resources
+
+    def get_by_id(self, scenario_id: str) -> ScenarioResources:
+        """
+        Like get, for the scenario's current definition. The loader only
+        re-parses the YAML file when it changed, and the resources are only
+        rebuilt when the resulting version differs.
+        """
+        return self.get(self.scenario_loader.load_scenario(scenario_id))
@@ -1,53 +1,194 @@
+import hashlib
 import redis
-import pickle
-from pydantic import BaseModel
-from typing import List, Dict, Any
+import time
+import zlib
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional
 import uuid
 
 from agent.security_agent import SecurityAgent
-from platform_logic.scenario_loader import Scenario
+from config.settings import REDIS_HOST, REDIS_PORT, SESSION_MAX_COUNT, SESSION_TTL
+from platform_logic.scenario_loader import Scenario, ScenarioLoader
+from platform_logic.scenario_pool import CopyOnWriteFS, ScenarioPool
+
+SESSION_SCHEMA_VERSION = 2
+SESSION_KEY_PREFIX = "session:"
+# Contents of files written by sessions, stored once per content hash.
+BLOB_KEY_PREFIX = "blob:"
+# Sorted set of session ids, scored by the time they were last used.
+SESSION_LRU_KEY = "sessions:lru"
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+class SessionRecord(BaseModel):
+    """
+    What is persisted for a session: its scenario, its chat history and the
+    changes made to the scenario's files. Everything else is rebuilt from
+    the scenario on load.
+    """
+    version: int = SESSION_SCHEMA_VERSION
+    session_id: str
+    scenario_id: str
+    # Username of the user who started the session.
+    owner: Optional[str] = None
+    created_at: float = Field(default_factory=time.time)
+    chat_history: List[Dict[str, str]] = Field(default_factory=list)
+    # Content hashes of the files written since the session started;
+    # None marks a deleted file.
+    vfs_changes: Dict[str, Optional[str]] = Field(default_factory=dict)
+
+    def dumps(self) -> bytes:
+        return zlib.compress(self.model_dump_json().encode("utf-8"))
+
+    @classmethod
+    def loads(cls, data: bytes) -> "SessionRecord":
+        record = cls.model_validate_json(zlib.decompress(data))
+        if record.version != SESSION_SCHEMA_VERSION:
+            raise ValueError(f"Unsupported session version {record.version}.")
+        return record
 
 class SessionState(BaseModel):
     session_id: str
+    scenario_id: str
     agent: SecurityAgent
-    virtual_file_system: Dict[str, str]
-    
+    virtual_file_system: CopyOnWriteFS
+    owner: Optional[str] = None
+    created_at: float = Field(default_factory=time.time)
+
     class Config:
         arbitrary_types_allowed = True
 
 class StateManager:
-    def __init__(self, redis_host: str = 'localhost', redis_port: int = 6379):
-        self.redis = redis.Redis(host=redis_host, port=redis_port, db=0)
+    """
+    Stores session records in Redis. Sessions expire `session_ttl` seconds
+    after they were last saved or loaded, and beyond `max_sessions` the
+    least recently used ones are evicted. File contents written by sessions
+    are stored once per content hash and shared by every session that
+    wrote the same content; a blob lives as long as a session using it.
+
+    Records and blobs are zlib-compressed, so an injected redis_client must
+    return bytes (decode_responses=False, the redis-py default).
+    """
 
-    def new_session(self, scenario: Scenario) -> SessionState:
+    def __init__(self, redis_host: str = REDIS_HOST, redis_port: int = REDIS_PORT,
+                 scenario_loader: Optional[ScenarioLoader] = None, redis_client=None,
+                 session_ttl: int = SESSION_TTL, max_sessions: int = SESSION_MAX_COUNT):
+        self.redis = redis_client or redis.Redis(host=redis_host, port=redis_port, db=0)
+        if self.redis.connection_pool.connection_kwargs.get("decode_responses"):
+            raise ValueError("StateManager needs a Redis client with decode_responses=False.")
+        self.session_ttl = session_ttl
+        self.max_sessions = max_sessions
+        # Sessions get lightweight handles over shared per-scenario resources.
+        self.scenario_pool = ScenarioPool(scenario_loader)
+
+    def new_session(self, scenario: Scenario, owner: Optional[str] = None) -> SessionState:
         session_id = str(uuid.uuid4())
-        agent = SecurityAgent(scenario)
-        
-        # Initialize virtual file system
-        virtual_fs = {}
-        for filepath in scenario.initial_state.files:
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    virtual_fs[filepath] = f.read()
-            except FileNotFoundError:
-                print(f"Warning: Initial state file not found: {filepath}")
-        
+        resources = self.scenario_pool.get(scenario)
+
         state = SessionState(
             session_id=session_id,
-            agent=agent,
-            virtual_file_system=virtual_fs
+            scenario_id=scenario.id,
+            agent=resources.agent.fork([]),
+            virtual_file_system=CopyOnWriteFS(resources.files),
+            owner=owner,
         )
         self.save_session(state)
+        self.evict_sessions()
         return state
 
     def save_session(self, state: SessionState):
-        """Serializes and saves the session state to Redis."""
-        serialized_state = pickle.dumps(state)
-        self.redis.set(state.session_id, serialized_state)
+        """Saves the session's compact record to Redis."""
+        blobs = {}
+        vfs_changes = {}
+        for path, content in state.virtual_file_system.changes().items():
+            if content is None:
+                vfs_changes[path] = None
+            else:
+                vfs_changes[path] = content_hash(content)
+                blobs[vfs_changes[path]] = content
+
+        record = SessionRecord(
+            session_id=state.session_id,
+            scenario_id=state.scenario_id,
+            owner=state.owner,
+            created_at=state.created_at,
+            chat_history=state.agent.chat_history,
+            vfs_changes=vfs_changes,
+        )
+        pipe = self.redis.pipeline()
+        for digest, content in blobs.items():
+            pipe.set(BLOB_KEY_PREFIX + digest, zlib.compress(content.encode("utf-8")), nx=True, ex=self.session_ttl)
+            pipe.expire(BLOB_KEY_PREFIX + digest, self.session_ttl)
+        pipe.set(SESSION_KEY_PREFIX + state.session_id, record.dumps(), ex=self.session_ttl)
+        pipe.zadd(SESSION_LRU_KEY, {state.session_id: time.time()})
+        pipe.execute()
 
     def load_session(self, session_id: str) -> SessionState:
-        """Loads and deserializes a session state from Redis."""
-        serialized_state = self.redis.get(session_id)
+        """Loads a session record from Redis and rebuilds its state."""
+        serialized_state = self.redis.getex(SESSION_KEY_PREFIX + session_id, ex=self.session_ttl)
         if not serialized_state:
             raise ValueError("Session not found.")
-        return pickle.loads(serialized_state)
+        record = SessionRecord.loads(serialized_state)
+        resources = self.scenario_pool.get_by_id(record.scenario_id)
+
+        digests = sorted({digest for digest in record.vfs_changes.values() if digest})
+        pipe = self.redis.pipeline()
+        pipe.zadd(SESSION_LRU_KEY, {session_id: time.time()})
+        for digest in digests:
+            pipe.getex(BLOB_KEY_PREFIX + digest, ex=self.session_ttl)
+        contents = dict(zip(digests, pipe.execute()[1:]))
+
+        vfs_changes = {}
+        for path, digest in record.vfs_changes.items():
+            if digest is None:
+                vfs_changes[path] = None
+            elif contents.get(digest) is not None:
+                vfs_changes[path] = zlib.decompress(contents[digest]).decode("utf-8")
+            else:
+                print(f"Warning: Missing content for '{path}' in session {session_id}")
+
+        return SessionState(
+            session_id=record.session_id,
+            scenario_id=record.scenario_id,
+            agent=resources.agent.fork(record.chat_history),
+            virtual_file_system=CopyOnWriteFS(resources.files, vfs_changes),
+            owner=record.owner,
+            created_at=record.created_at
+        )
+
+    def evict_sessions(self) -> int:
+        """
+        Forgets expired sessions and deletes the least recently used ones
+        beyond the cap. Returns the number of sessions evicted.
+        """
+        self.redis.zremrangebyscore(SESSION_LRU_KEY, 0, time.time() - self.session_ttl)
+        excess = self.redis.zcard(SESSION_LRU_KEY) - self.max_sessions
+        if excess <= 0:
+            return 0
+        evicted = [session_id for session_id, _ in self.redis.zpopmin(SESSION_LRU_KEY, excess)]
+        self.redis.delete(*[SESSION_KEY_PREFIX + session_id.decode("utf-8") for session_id in evicted])
+        return len(evicted)
+
+    def _key_bytes(self, prefix: str) -> Dict[str, int]:
+        keys = list(self.redis.scan_iter(match=prefix + "*", count=1000))
+        pipe = self.redis.pipeline()
+        for key in keys:
+            pipe.strlen(key)
+        sizes = pipe.execute() if keys else []
+        return {"count": sum(1 for size in sizes if size), "bytes": sum(sizes)}
+
+    def stats(self) -> Dict[str, Any]:
+        """Session and file content counts and their stored sizes in bytes."""
+        self.redis.zremrangebyscore(SESSION_LRU_KEY, 0, time.time() - self.session_ttl)
+        sessions = self._key_bytes(SESSION_KEY_PREFIX)
+        blobs = self._key_bytes(BLOB_KEY_PREFIX)
+        return {
+            "sessions": sessions["count"],
+            "session_bytes": sessions["bytes"],
+            "blobs": blobs["count"],
+            "blob_bytes": blobs["bytes"],
+            "total_bytes": sessions["bytes"] + blobs["bytes"],
+            "session_ttl": self.session_ttl,
+            "max_sessions": self.max_sessions,
+        }
@@ -1,29 +1,139 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
+from core.access_control import authenticate_user_async, issue_session_token, verify_session_token
+from core.telemetry import get_collector, record_timings
 from platform_logic.scenario_loader import ScenarioLoader
 from platform_logic.state_manager import StateManager
+from users.schema import User
+from utils.interaction_log import Timer, log_event, new_request_id, setup_interaction_logging
 
 app = FastAPI()
+setup_interaction_logging()
 scenario_loader = ScenarioLoader()
-state_manager = StateManager()
+state_manager = StateManager(scenario_loader=scenario_loader)
 
 class StartSessionRequest(BaseModel):
     scenario_id: str
 
+class AskRequest(BaseModel):
+    question: str
+
+class LoginRequest(BaseModel):
+    username: str
+    code: str
+
+
+def require_user(authorization: Optional[str] = Header(None)) -> User:
+    """
+    Resolves the session token issued by /auth/login, sent as
+    `Authorization: Bearer <token>`. Verifying it is an HMAC check, not bcrypt.
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    user = verify_session_token(token) if scheme.lower() == "bearer" else None
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid or expired session token.",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return user
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Formats one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_agent_events(session_state, question: str, user: User) -> AsyncIterator[str]:
+    """
+    Streams an agent's answer as server-sent events: "tool" for each tool
+    call, "observation" for its result, "answer" for the final output, then
+    "done" (or "error"). The session is saved once the answer is complete.
+    """
+    request_id = new_request_id()
+    tools = []
+    answer = ""
+    with Timer() as total:
+        try:
+            with Timer() as generate:
+                async for chunk in session_state.agent.aask(question):
+                    for action in chunk.get("actions", []):
+                        tools.append(action.tool)
+                        yield sse_event("tool", {"tool": action.tool, "input": action.tool_input})
+                    for step in chunk.get("steps", []):
+                        yield sse_event("observation", {"tool": step.action.tool, "output": str(step.observation)})
+                    if "output" in chunk:
+                        answer += chunk["output"]
+                        yield sse_event("answer", {"text": chunk["output"]})
+            with Timer() as save:
+                await asyncio.to_thread(state_manager.save_session, session_state)
+            yield sse_event("done", {"session_id": session_state.session_id})
+        except Exception as e:
+            print(f"Error answering question for session {session_state.session_id}: {e}")
+            log_event("agent.error", request_id=request_id, channel="server", user=user.username,
+                      session_id=session_state.session_id, error=str(e))
+            yield sse_event("error", {"detail": "An error occurred while generating the answer."})
+            return
+    record_timings("agent", {"generation": generate.ms / 1000, "save_session": save.ms / 1000, "total": total.ms / 1000})
+    log_event("agent.answer", request_id=request_id, channel="server", user=user.username,
+              session_id=session_state.session_id, scenario_id=session_state.scenario_id,
+              role=session_state.agent.scenario.user_role, question=question, answer=answer, tools=tools,
+              durations_ms={"generation": generate.ms, "save_session": save.ms, "total": total.ms})
+
 @app.get("/")
 def read_root():
     return {"message": "Security Testing Platform API is running."}
 
+@app.post("/auth/login")
+async def login(request: LoginRequest):
+    # bcrypt runs on a worker thread; later requests can present the token instead.
+    user = await authenticate_user_async(request.username, request.code)
+    log_event("auth.login" if user else "auth.failed", channel="server", user=request.username,
+              role=user.role if user else None)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid username or code.")
+    return {"token": issue_session_token(user), "username": user.username, "role": user.role}
+
+@app.get("/stats")
+def stats():
+    return state_manager.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text format, scraped from the in-process collector.
+    return PlainTextResponse(get_collector().render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.get("/scenarios")
-def list_scenarios():
-    return scenario_loader.list_scenarios()
+def list_scenarios(request: Request):
+    # Served from the precomputed catalog; unchanged listings are a 304.
+    body, etag = scenario_loader.catalog()
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 @app.post("/session/start")
-def start_session(request: StartSessionRequest):
+def start_session(request: StartSessionRequest, user: User = Depends(require_user)):
     try:
         scenario = scenario_loader.load_scenario(request.scenario_id)
-        session_state = state_manager.new_session(scenario)
+        session_state = state_manager.new_session(scenario, owner=user.username)
         return {"session_id": session_state.session_id}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+
+@app.post("/session/{session_id}/ask")
+async def ask(session_id: str, request: AskRequest, user: User = Depends(require_user)):
+    try:
+        session_state = await asyncio.to_thread(state_manager.load_session, session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if session_state.owner != user.username:
+        # Same answer as a missing session, so ids of other users' sessions are not confirmed.
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return StreamingResponse(
+        stream_agent_events(session_state, request.question, user),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
@@ -6,15 +6,15 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
 
-from config.settings import API_KEY, BASE_URL
+from config.settings import OPENROUTER_API_KEY, BASE_URL
 from core.access_control import authenticate_user
 from core.embeddings import get_embedding_model
-from core.retrieval import run_rag_pipeline
+from core.retrieval import DoneEvent, get_rag_pipeline
 
 def get_tester_llm():
     """Initializes a separate LLM for the testing agent."""
     return ChatOpenAI(
-        api_key=API_KEY,
+        api_key=OPENROUTER_API_KEY,
         base_url=BASE_URL,
         model="openai/gpt-3.5-turbo",
         temperature=0.7,
@@ -34,12 +34,15 @@ async def main():
     embeddings = get_embedding_model()
     tester_llm = get_tester_llm()
     
-    if not embeddings or not tester_llm:
+    pipeline = get_rag_pipeline(user, embeddings) if embeddings else None
+
+    if not pipeline or not tester_llm:
         print("Failed to initialize models.")
         return
 
     # 3. Set up the conversation
     rag_chat_history = []
+    rag_history_window = pipeline.new_history_window()
     tester_chat_history = [
         SystemMessage(content=(
             "You are a test agent. Your goal is to discover the capabilities of a RAG system. "
@@ -65,17 +68,15 @@ async def main():
         
         # 5. RAG system generates an answer
         print("RAG System is processing...")
-        result_stream = run_rag_pipeline(user, question, embeddings, rag_chat_history)
-        
-        answer_parts = []
+        result_events = pipeline.astream_events(question, rag_chat_history, history_window=rag_history_window)
+
+        answer = ""
         sources = []
-        for chunk in result_stream:
-            if "answer" in chunk:
-                answer_parts.append(chunk["answer"])
-            if "context" in chunk:
-                sources.extend(chunk["context"])
+        async for event in result_events:
+            if isinstance(event, DoneEvent):
+                answer = event.answer
+                sources = event.documents
         
-        answer = "".join(answer_parts)
         print(f"Answer: {answer}")
 
         if sources:
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Modules are imported the way the apps import them, from the rag_system directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config.settings as settings
+
+# Keep interaction logs written by imported apps out of the working tree.
+settings.INTERACTION_LOG_PATH = os.path.join(tempfile.mkdtemp(prefix="rag-tests-"), "interactions.jsonl")
@@ -0,0 +1,41 @@
+import numpy as np
+
+from core.embeddings import EmbeddingCache
+
+
+def vector(value: float) -> np.ndarray:
+    return np.full(4, value, dtype=np.float32)
+
+
+def test_lookups_do_not_write(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=10)
+    cache.put_many({"a": vector(1), "b": vector(2)})
+    changes = cache._conn.total_changes
+
+    found = cache.get_many(["a", "b", "missing"])
+
+    assert set(found) == {"a", "b"}
+    np.testing.assert_array_equal(found["a"], vector(1))
+    assert cache._conn.total_changes == changes
+
+
+def test_buffered_access_times_decide_eviction(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put_many({"old": vector(1)})
+    cache.put_many({"newer": vector(2)})
+    cache.get_many(["old"])
+
+    cache.put_many({"newest": vector(3)})
+
+    assert set(cache.get_many(["old", "newer", "newest"])) == {"old", "newest"}
+
+
+def test_access_times_are_flushed_in_batches(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=10, access_flush_size=2)
+    cache.put_many({"a": vector(1), "b": vector(2)})
+    changes = cache._conn.total_changes
+
+    cache.get_many(["a"])
+    assert cache._conn.total_changes == changes
+    cache.get_many(["b"])
+    assert cache._conn.total_changes == changes + 2
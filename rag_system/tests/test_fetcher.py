@@ -0,0 +1,144 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from tools.fetcher import ResponseCache, fetch
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves the few behaviours the fetcher has to cope with."""
+    requests_seen = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        StandInHandler.requests_seen.append((self.path, self.headers.get("If-None-Match")))
+        if self.path == "/silent":
+            time.sleep(2)
+            self._send(b"too late")
+        elif self.path == "/drip":
+            if self.headers.get("If-None-Match") == '"drip"':
+                self.send_response(304)
+                self.send_header("ETag", '"drip"')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("ETag", '"drip"')
+            self.end_headers()
+            for _ in range(40):
+                self.wfile.write(b"x" * 100)
+                self.wfile.flush()
+                time.sleep(0.05)
+        elif self.path == "/large":
+            self._send(b"a" * 100_000)
+        elif self.path == "/etag":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.send_header("ETag", '"v1"')
+                self.end_headers()
+            else:
+                self._send(b"<html><body>versioned</body></html>", etag='"v1"')
+        else:
+            self._send(self.path.encode("utf-8"))
+
+    def _send(self, body: bytes, etag: str = None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up (timeouts, size limits) close the connection early.
+        pass
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = StandInServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path), ttl=3600)
+
+
+def test_unresponsive_server_times_out(base_url, cache):
+    start = time.monotonic()
+    with pytest.raises(requests.RequestException):
+        fetch(base_url + "/silent", timeout=0.3, cache=cache)
+    assert time.monotonic() - start < 1.5
+
+
+def test_slow_body_is_cut_off_at_the_deadline(base_url, cache):
+    start = time.monotonic()
+    result = fetch(base_url + "/drip", timeout=0.5, cache=cache)
+    assert time.monotonic() - start < 1.5
+    assert result.truncated
+    assert 0 < len(result.content) < 4000
+
+
+def test_body_cut_off_at_the_deadline_is_not_cached(base_url, tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=0)
+    fetch(base_url + "/drip", timeout=0.5, cache=cache)
+    StandInHandler.requests_seen.clear()
+
+    second = fetch(base_url + "/drip", timeout=0.5, cache=cache)
+
+    assert cache.get(base_url + "/drip") is None
+    assert StandInHandler.requests_seen == [("/drip", None)]
+    assert not second.from_cache
+
+
+def test_body_is_cut_off_at_max_bytes(base_url, cache):
+    result = fetch(base_url + "/large", max_bytes=1000, cache=cache)
+    assert result.truncated
+    assert len(result.content) == 1000
+    assert cache.get(base_url + "/large") is not None
+
+
+def test_stale_entry_is_revalidated_with_its_etag(base_url, tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=0)
+    first = fetch(base_url + "/etag", cache=cache)
+    StandInHandler.requests_seen.clear()
+
+    second = fetch(base_url + "/etag", cache=cache)
+
+    assert StandInHandler.requests_seen == [("/etag", '"v1"')]
+    assert second.from_cache
+    assert second.content == first.content
+
+
+def test_fresh_entry_is_served_without_a_request(base_url, cache):
+    fetch(base_url + "/page", cache=cache)
+    StandInHandler.requests_seen.clear()
+
+    assert fetch(base_url + "/page", cache=cache).from_cache
+    assert StandInHandler.requests_seen == []
+
+
+def test_least_recently_used_entries_are_evicted(base_url, tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=3600, max_entries=2)
+    fetch(base_url + "/one", cache=cache)
+    fetch(base_url + "/two", cache=cache)
+    assert cache.get(base_url + "/one") is not None
+
+    fetch(base_url + "/three", cache=cache)
+
+    assert cache.get(base_url + "/one") is not None
+    assert cache.get(base_url + "/two") is None
+    assert cache.get(base_url + "/three") is not None
@@ -0,0 +1,132 @@
+import os
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import core.ingestion as ingestion
+from core.ingestion import IngestionManifest, sync_vectorstore
+from core.lexical_index import BM25Index
+from core.vectorstore import open_vectorstore
+
+
+class CountingEmbeddings(Embeddings):
+    """Constant vectors; counts how many texts were embedded."""
+
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [[1.0, float(len(text) % 7), 0.5] for text in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.5]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "alpha.txt").write_text("alpha memo about the nova project")
+    (data_dir / "beta.txt").write_text("beta memo about the orion budget")
+    store_dir = str(tmp_path / "store")
+    embeddings = CountingEmbeddings()
+    vector_store = open_vectorstore(embeddings, store_dir)
+    lexical_index = BM25Index(os.path.join(store_dir, "lexical.sqlite3"))
+
+    def sync(dir_paths=None, corpus_roots=None):
+        dir_paths = dir_paths or [str(data_dir)]
+        return sync_vectorstore(vector_store, IngestionManifest.load(store_dir), dir_paths, lexical_index,
+                                corpus_roots=corpus_roots)
+
+    def chunk_ids(name):
+        return IngestionManifest.load(store_dir).records[str(data_dir / name)].chunk_ids
+
+    sync()
+    return data_dir, embeddings, vector_store, lexical_index, sync, chunk_ids
+
+
+def stored_ids(vector_store):
+    return set(vector_store.get(include=[])["ids"])
+
+
+def lexical_hits(lexical_index, query):
+    return [document.id for document, _ in lexical_index.search(query, k=10)]
+
+
+def test_warm_sync_embeds_nothing(corpus):
+    _, embeddings, vector_store, _, sync, _ = corpus
+    assert embeddings.embedded == 2
+    ids = stored_ids(vector_store)
+
+    assert sync() is False
+    assert embeddings.embedded == 2
+    assert stored_ids(vector_store) == ids
+
+
+def test_touched_file_is_not_re_embedded(corpus):
+    data_dir, embeddings, _, _, sync, chunk_ids = corpus
+    before = chunk_ids("alpha.txt")
+    stat = os.stat(data_dir / "alpha.txt")
+    os.utime(data_dir / "alpha.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    sync()
+
+    assert embeddings.embedded == 2
+    assert chunk_ids("alpha.txt") == before
+    # The new stat fingerprint is recorded, so the file is not hashed again.
+    assert sync() is False
+
+
+def test_edited_file_replaces_its_chunks(corpus):
+    data_dir, embeddings, vector_store, lexical_index, sync, chunk_ids = corpus
+    old_ids = chunk_ids("alpha.txt")
+    beta_ids = chunk_ids("beta.txt")
+    (data_dir / "alpha.txt").write_text("alpha memo about the vega launch")
+
+    assert sync() is True
+
+    new_ids = chunk_ids("alpha.txt")
+    assert embeddings.embedded == 3
+    assert not set(new_ids) & set(old_ids)
+    assert stored_ids(vector_store) == set(new_ids) | set(beta_ids)
+    assert lexical_hits(lexical_index, "nova") == []
+    assert lexical_hits(lexical_index, "vega") == new_ids
+
+
+def test_deleted_file_is_removed_from_both_indexes(corpus):
+    data_dir, _, vector_store, lexical_index, sync, chunk_ids = corpus
+    beta_ids = chunk_ids("beta.txt")
+    os.remove(data_dir / "alpha.txt")
+
+    assert sync() is True
+
+    assert stored_ids(vector_store) == set(beta_ids)
+    assert len(lexical_index) == len(beta_ids)
+    assert lexical_hits(lexical_index, "nova") == []
+
+
+def test_files_outside_the_corpus_roots_are_removed(corpus, tmp_path):
+    _, _, vector_store, lexical_index, sync, _ = corpus
+    other_dir = tmp_path / "other"
+    other_dir.mkdir()
+    (other_dir / "gamma.txt").write_text("gamma notes")
+
+    sync([str(other_dir)], corpus_roots=[str(other_dir)])
+
+    assert len(stored_ids(vector_store)) == 1
+    assert len(lexical_index) == 1
+    assert lexical_hits(lexical_index, "memo") == []
+
+
+def test_chunking_change_re_embeds_everything(corpus, monkeypatch):
+    _, embeddings, vector_store, _, sync, chunk_ids = corpus
+    ids = stored_ids(vector_store)
+    monkeypatch.setattr(ingestion, "chunking_fingerprint", lambda: "another policy")
+
+    assert sync() is True
+
+    assert embeddings.embedded == 4
+    # Same content, so the deterministic chunk ids are reused.
+    assert stored_ids(vector_store) == ids
+    assert sync() is False
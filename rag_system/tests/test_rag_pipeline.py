@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from core.answer_cache import SemanticAnswerCache
+from core.rerank import Reranker
+from core.retrieval import DoneEvent, RagPipeline
+from core.rewrite import QuestionRewriter
+
+HISTORY = [
+    {"role": "user", "content": "What is Project Nova?"},
+    {"role": "assistant", "content": "Project Nova is the new satellite programme."},
+]
+FOLLOW_UP = "What about its budget?"
+
+
+class WordEmbeddings(Embeddings):
+    def _embed(self, text):
+        words = text.lower().split()
+        return [1.0, float("budget?" in words), float("nova" in words)]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class FakeStore:
+    def similarity_search(self, query, k, filter):
+        return [Document(page_content="Nova budget: 4M", metadata={"tier": "public"})]
+
+
+class FakeLexicalIndex:
+    def search(self, query, k, tiers):
+        return []
+
+
+def make_pipeline():
+    embeddings = WordEmbeddings()
+    corpus = SimpleNamespace(embeddings=embeddings, vector_store=FakeStore(), lexical_index=FakeLexicalIndex(),
+                             version="v1", refresh=lambda: False)
+    rewrite_llm = FakeListChatModel(responses=["What is the budget of Project Nova?", "unused"])
+    answer_llm = FakeListChatModel(responses=["About 4M.", "unused"])
+    rewriter = QuestionRewriter(rewrite_llm, mode="auto", speculative=False)
+    pipeline = RagPipeline(("public",), corpus, answer_llm, rewriter, Reranker(embeddings, method="none"))
+    return pipeline, rewrite_llm, answer_llm
+
+
+def test_repeated_follow_up_skips_the_rewrite_call():
+    pipeline, rewrite_llm, answer_llm = make_pipeline()
+    answer_cache = SemanticAnswerCache(WordEmbeddings())
+    history_window = pipeline.new_history_window()
+
+    first = list(pipeline.stream_events(FOLLOW_UP, HISTORY, answer_cache, history_window))[-1]
+    second = list(pipeline.stream_events(FOLLOW_UP, HISTORY, answer_cache, history_window))[-1]
+
+    assert isinstance(second, DoneEvent) and second.cached
+    assert not first.cached
+    assert second.standalone_question == "What is the budget of Project Nova?"
+    assert "rewrite" not in second.timings
+    assert rewrite_llm.i == 1
+    assert answer_llm.i == 1
+
+
+def test_rewrites_are_remembered_per_history():
+    answer_cache = SemanticAnswerCache(WordEmbeddings())
+    pipeline, _, _ = make_pipeline()
+    messages = pipeline.new_history_window().window(HISTORY).messages
+    answer_cache.store_rewrite(FOLLOW_UP, messages, "What is the budget of Project Nova?")
+
+    assert answer_cache.lookup_rewrite("what about  its budget?", messages) == "What is the budget of Project Nova?"
+    assert answer_cache.lookup_rewrite(FOLLOW_UP, messages[:1]) is None
@@ -0,0 +1,57 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import core.access_control as access_control
+import server
+from core.access_control import UserIndex, issue_session_token, list_users
+
+
+@pytest.fixture
+def client():
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def token():
+    return issue_session_token(list_users()[0])
+
+
+@pytest.mark.parametrize("headers", [{}, {"Authorization": "Bearer not-a-token"}, {"Authorization": "Basic abc"}])
+def test_session_endpoints_require_a_session_token(client, headers):
+    assert client.post("/session/start", json={"scenario_id": "missing"}, headers=headers).status_code == 401
+    assert client.post("/session/abc/ask", json={"question": "hi"}, headers=headers).status_code == 401
+
+
+def test_session_token_is_accepted(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    # Authenticated; the scenario and session simply do not exist.
+    assert client.post("/session/start", json={"scenario_id": "missing"}, headers=headers).status_code == 404
+
+
+class OwnedSessions:
+    """Every session exists and belongs to `owner`."""
+
+    def __init__(self, owner: str):
+        self.owner = owner
+
+    def load_session(self, session_id: str):
+        return SimpleNamespace(session_id=session_id, owner=self.owner)
+
+
+def test_sessions_of_other_users_are_not_found(client, monkeypatch, tmp_path):
+    credentials = tmp_path / "users.json"
+    credentials.write_text(json.dumps([
+        {"username": "alice", "role": "public", "code": "hash-a"},
+        {"username": "mallory", "role": "public", "code": "hash-m"},
+    ]))
+    monkeypatch.setattr(access_control, "_user_index", UserIndex(str(credentials)))
+    monkeypatch.setattr(server, "state_manager", OwnedSessions("alice"))
+    mallory = access_control._user_index.get("mallory")
+    headers = {"Authorization": f"Bearer {issue_session_token(mallory)}"}
+
+    response = client.post("/session/alices-session/ask", json={"question": "hi"}, headers=headers)
+
+    assert response.status_code == 404
@@ -0,0 +1,133 @@
+import copy
+
+import fakeredis
+import pytest
+
+import platform_logic.scenario_pool as scenario_pool
+from agent.security_agent import SecurityAgent
+from platform_logic.scenario_loader import Scenario
+from platform_logic.state_manager import BLOB_KEY_PREFIX, SESSION_KEY_PREFIX, SESSION_LRU_KEY, StateManager
+
+SESSION_TTL = 600
+
+
+class FakeAgent(SecurityAgent):
+    """Skips the models and tools; sessions only need the chat history."""
+
+    def __init__(self, scenario: Scenario):
+        self.scenario = scenario
+        self.chat_history = []
+
+    def fork(self, chat_history):
+        agent = copy.copy(self)
+        agent.chat_history = list(chat_history)
+        return agent
+
+
+class FakeLoader:
+    def __init__(self, scenario: Scenario):
+        self.scenario = scenario
+
+    def load_scenario(self, scenario_id: str) -> Scenario:
+        return self.scenario
+
+
+@pytest.fixture
+def scenario(tmp_path):
+    initial_file = tmp_path / "memo.txt"
+    initial_file.write_text("initial memo")
+    return Scenario(
+        id="level1", name="Level 1", description="", agent_prompt="",
+        initial_state={"files": [str(initial_file)]}, available_tools=[],
+        user_role="public", win_conditions=[],
+    )
+
+
+@pytest.fixture
+def make_manager(monkeypatch, scenario):
+    monkeypatch.setattr(scenario_pool, "SecurityAgent", FakeAgent)
+    client = fakeredis.FakeRedis()
+
+    def make(**kwargs):
+        kwargs.setdefault("session_ttl", SESSION_TTL)
+        return StateManager(scenario_loader=FakeLoader(scenario), redis_client=client, **kwargs)
+    return make
+
+
+def test_load_refreshes_ttl(make_manager, scenario):
+    manager = make_manager()
+    state = manager.new_session(scenario)
+    state.virtual_file_system["notes.txt"] = "written by the session"
+    manager.save_session(state)
+    blob_keys = list(manager.redis.scan_iter(match=BLOB_KEY_PREFIX + "*"))
+    for key in [SESSION_KEY_PREFIX + state.session_id, *blob_keys]:
+        manager.redis.expire(key, 5)
+
+    loaded = manager.load_session(state.session_id)
+
+    assert loaded.virtual_file_system["notes.txt"] == "written by the session"
+    assert manager.redis.ttl(SESSION_KEY_PREFIX + state.session_id) > 5
+    assert all(manager.redis.ttl(key) > 5 for key in blob_keys)
+
+
+def test_owner_is_persisted(make_manager, scenario):
+    manager = make_manager()
+    state = manager.new_session(scenario, owner="alice")
+
+    assert manager.load_session(state.session_id).owner == "alice"
+
+
+def test_least_recently_used_sessions_are_evicted(make_manager, scenario):
+    manager = make_manager(max_sessions=2)
+    first = manager.new_session(scenario)
+    second = manager.new_session(scenario)
+    manager.load_session(first.session_id)
+
+    third = manager.new_session(scenario)
+
+    assert manager.redis.zcard(SESSION_LRU_KEY) == 2
+    with pytest.raises(ValueError):
+        manager.load_session(second.session_id)
+    manager.load_session(first.session_id)
+    manager.load_session(third.session_id)
+
+
+def test_identical_file_contents_are_stored_once(make_manager, scenario):
+    manager = make_manager()
+    states = [manager.new_session(scenario) for _ in range(3)]
+    for state in states:
+        state.virtual_file_system["report.txt"] = "the same report"
+        manager.save_session(state)
+
+    assert len(list(manager.redis.scan_iter(match=BLOB_KEY_PREFIX + "*"))) == 1
+    for state in states:
+        assert manager.load_session(state.session_id).virtual_file_system["report.txt"] == "the same report"
+
+
+def test_stats_endpoint_reports_counts_and_bytes(make_manager, scenario, monkeypatch):
+    from fastapi.testclient import TestClient
+    import server
+
+    manager = make_manager()
+    monkeypatch.setattr(server, "state_manager", manager)
+    states = [manager.new_session(scenario) for _ in range(2)]
+    states[0].virtual_file_system["a.txt"] = "first"
+    states[1].virtual_file_system["b.txt"] = "second"
+    for state in states:
+        manager.save_session(state)
+
+    stats = TestClient(server.app).get("/stats").json()
+
+    session_bytes = sum(manager.redis.strlen(SESSION_KEY_PREFIX + state.session_id) for state in states)
+    blob_bytes = sum(manager.redis.strlen(key) for key in manager.redis.scan_iter(match=BLOB_KEY_PREFIX + "*"))
+    assert stats["sessions"] == 2
+    assert stats["blobs"] == 2
+    assert stats["session_bytes"] == session_bytes
+    assert stats["blob_bytes"] == blob_bytes
+    assert stats["total_bytes"] == session_bytes + blob_bytes
+    assert stats["session_ttl"] == SESSION_TTL
+
+
+def test_rejects_decoding_clients():
+    with pytest.raises(ValueError):
+        StateManager(redis_client=fakeredis.FakeRedis(decode_responses=True))
@@ -0,0 +1,117 @@
+import hashlib
+import os
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+import core.ingestion as ingestion
+from config.settings import ROLE_TIERS
+from core.access_control import AccessPolicy
+from core.ingestion import IngestionManifest, sync_vectorstore
+from core.lexical_index import BM25Index, tokenize
+from core.retrieval import HybridRetriever, VectorRetriever
+from core.vectorstore import open_vectorstore
+
+QUERY = "quarterly budget report"
+FILES = {
+    "public": ["The quarterly budget report is published for everyone.",
+               "Office opening hours and the public budget summary."],
+    "worker": ["Quarterly budget report: internal team allocations.",
+               "Worker shift schedule for the budget report week."],
+    "admin": ["Confidential quarterly budget report with salaries.",
+              "Admin credentials rotation and the budget report audit."],
+}
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic bag-of-words vectors; no model download."""
+
+    def _embed(self, text: str):
+        vector = [0.0] * 32 + [1.0]
+        for token in tokenize(text):
+            vector[int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16) % 32] += 1.0
+        return vector
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    root = tmp_path_factory.mktemp("tiers")
+    data_tiers = {}
+    for tier, texts in FILES.items():
+        directory = root / "data" / tier
+        directory.mkdir(parents=True)
+        for i, text in enumerate(texts):
+            (directory / f"{tier}-{i}.txt").write_text(text)
+        data_tiers[tier] = str(directory)
+    policy = AccessPolicy(role_tiers=ROLE_TIERS, data_tiers=data_tiers)
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        # Tag chunks with the fixture tiers instead of the real data directories.
+        monkeypatch.setattr(ingestion, "get_data_tier", policy.tier_of)
+        store_dir = str(root / "store")
+        vector_store = open_vectorstore(HashEmbeddings(), store_dir)
+        lexical_index = BM25Index(str(root / "store" / "lexical.sqlite3"))
+        roots = list(data_tiers.values())
+        sync_vectorstore(vector_store, IngestionManifest.load(store_dir), roots, lexical_index, corpus_roots=roots)
+    return policy, vector_store, lexical_index, data_tiers
+
+
+def retrievers(policy, vector_store, lexical_index, tiers):
+    tier_filter = policy.metadata_filter(tiers)
+    return {
+        "vector": lambda query: VectorRetriever(vector_store=vector_store, tier_filter=tier_filter).invoke(query),
+        "lexical": lambda query: [document for document, _ in lexical_index.search(query, k=20, tiers=tiers)],
+        "hybrid": lambda query: HybridRetriever(vector_store=vector_store, lexical_index=lexical_index,
+                                                tiers=list(tiers), tier_filter=tier_filter).invoke(query),
+    }
+
+
+@pytest.mark.parametrize("role", sorted(ROLE_TIERS))
+@pytest.mark.parametrize("mode", ["vector", "lexical", "hybrid"])
+def test_retrievers_only_return_chunks_of_the_role_tiers(corpus, role, mode):
+    policy, vector_store, lexical_index, _ = corpus
+    tiers = policy.tiers(role)
+
+    documents = retrievers(policy, vector_store, lexical_index, tiers)[mode](QUERY)
+
+    assert documents
+    assert {document.metadata["tier"] for document in documents} <= set(tiers)
+    assert all(policy.tier_of(document.metadata["source"]) in tiers for document in documents)
+    # Every readable chunk mentions the query, so each readable tier shows up.
+    assert {document.metadata["tier"] for document in documents} == set(tiers)
+
+
+def test_role_tiers(corpus):
+    policy, _, _, _ = corpus
+    assert policy.tiers("public") == ["public"]
+    assert policy.tiers("worker") == ["public", "worker"]
+    # Managers already retrieved from the admin directory before tiers existed.
+    assert policy.tiers("manager") == ["public", "worker", "admin"]
+    assert policy.tiers("admin") == ["public", "worker", "admin"]
+    assert policy.tiers("contractor") == []
+
+
+def test_authorize_documents_drops_untagged_and_foreign_tier_documents(corpus):
+    policy, _, _, data_tiers = corpus
+    admin_file = os.path.join(data_tiers["admin"], "admin-0.txt")
+    public_file = os.path.join(data_tiers["public"], "public-0.txt")
+    documents = [
+        Document(page_content="untagged"),
+        Document(page_content="foreign tier", metadata={"tier": "admin"}),
+        # The source path decides, whatever the tier metadata claims.
+        Document(page_content="mislabelled", metadata={"tier": "public", "source": admin_file}),
+        Document(page_content="outside every tier", metadata={"source": "/elsewhere/notes.txt"}),
+        Document(page_content="readable", metadata={"tier": "public", "source": public_file}),
+        Document(page_content="readable by tier", metadata={"tier": "worker"}),
+    ]
+
+    authorized = policy.authorize_documents(documents, policy.tiers("worker"))
+
+    assert [document.page_content for document in authorized] == ["readable", "readable by tier"]
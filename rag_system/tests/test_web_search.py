@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+import tools.web_search as web_search
+from tools.web_search import (CachedWebSearch, SearchProvider, TokenBucket, get_web_search,
+                              web_search_tool)
+
+
+class FakeProvider(SearchProvider):
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.queries = []
+
+    def search(self, query, max_results):
+        self.queries.append(query)
+        time.sleep(self.delay)
+        return [{"url": "https://example.com", "content": f"results for {query}"}]
+
+
+def test_search_provider_is_abstract():
+    with pytest.raises(TypeError):
+        SearchProvider()
+
+
+def test_token_bucket_rejects_non_positive_rates():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0, capacity=1)
+
+
+def test_equivalent_queries_are_cached():
+    provider = FakeProvider()
+    search = CachedWebSearch(provider)
+
+    first = search.search("Project  Nova")
+    second = search.search("project nova ")
+
+    assert first == second
+    assert provider.queries == ["Project  Nova"]
+
+
+def test_concurrent_identical_queries_share_one_call():
+    provider = FakeProvider(delay=0.2)
+    search = CachedWebSearch(provider)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(search.search("nova"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(provider.queries) == 1
+    assert len(results) == 5
+
+
+def test_tool_uses_the_injected_provider(monkeypatch):
+    # Restored after the test, so later tests do not get the fake provider.
+    monkeypatch.setattr(web_search, "_web_search", None)
+    first = FakeProvider()
+    assert get_web_search(first).provider is first
+    second = FakeProvider()
+    assert get_web_search(second).provider is second
+    assert get_web_search().provider is second
+
+    web_search_tool.invoke({"query": "nova"})
+
+    assert second.queries == ["nova"]
+    assert first.queries == []
@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Union
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+from config.settings import (FETCH_CACHE_DIR, FETCH_CACHE_MAX_BYTES, FETCH_CACHE_MAX_ENTRIES,
+                             FETCH_CACHE_TTL, FETCH_MAX_BYTES, FETCH_MAX_CONNECTIONS, FETCH_TIMEOUT)
+from core.history import estimate_tokens
+
+USER_AGENT = "Mozilla/5.0 (compatible; InnovateX-RAG/1.0)"
+# Elements that are never part of a page's main text.
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "svg", "iframe",
+                    "nav", "header", "footer", "aside", "form", "button"]
+
+_session = None
+_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Returns the process-wide HTTP session for web fetches, so connections
+    to the same host are pooled and reused across tool calls.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=FETCH_MAX_CONNECTIONS, pool_maxsize=FETCH_MAX_CONNECTIONS)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session.headers["User-Agent"] = USER_AGENT
+        return _session
+
+
+@dataclass
+class FetchResult:
+    """A fetched response body (possibly cut off at the size limit)."""
+    url: str
+    status: int
+    content: bytes
+    content_type: str = ""
+    encoding: Optional[str] = None
+    truncated: bool = False
+    from_cache: bool = False
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+class ResponseCache:
+    """
+    On-disk cache of successful responses, one metadata and one body file
+    per URL. Entries older than `ttl` are revalidated with the server using
+    their ETag / Last-Modified before they are reused. Beyond `max_entries`
+    entries or `max_bytes` on disk, the least recently used are evicted.
+    """
+
+    def __init__(self, cache_dir: str = FETCH_CACHE_DIR, ttl: float = FETCH_CACHE_TTL,
+                 max_entries: int = FETCH_CACHE_MAX_ENTRIES, max_bytes: int = FETCH_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._evict_lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + ".json", base + ".body"
+
+    def get(self, url: str) -> Optional[FetchResult]:
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                content = f.read()
+            self._touch(meta_path)
+        except (OSError, ValueError):
+            return None
+        return FetchResult(content=content, from_cache=True, **meta)
+
+    def is_fresh(self, result: FetchResult) -> bool:
+        return time.time() - result.fetched_at < self.ttl
+
+    def put(self, result: FetchResult):
+        meta_path, body_path = self._paths(result.url)
+        meta = asdict(result)
+        del meta["content"], meta["from_cache"]
+        # Write the body first; the metadata file marks the entry complete.
+        for path, data, mode in ((body_path, result.content, "wb"), (meta_path, json.dumps(meta), "w")):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, mode) as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        self._touch(meta_path)
+        self.evict()
+
+    @staticmethod
+    def _touch(meta_path: str):
+        # The metadata file's mtime records when the entry was last used; it
+        # is set explicitly since file timestamps come from a coarse clock.
+        now = time.time_ns()
+        os.utime(meta_path, ns=(now, now))
+
+    def evict(self) -> int:
+        """Deletes least recently used entries beyond the limits. Returns how many."""
+        with self._evict_lock:
+            entries: Dict[str, list] = {}
+            for entry in os.scandir(self.cache_dir):
+                key, extension = os.path.splitext(entry.name)
+                if extension not in (".json", ".body"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                size_and_use = entries.setdefault(key, [0, 0])
+                size_and_use[0] += stat.st_size
+                size_and_use[1] = max(size_and_use[1], stat.st_mtime_ns)
+
+            count = len(entries)
+            total = sum(size for size, _ in entries.values())
+            evicted = 0
+            for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                for extension in (".json", ".body"):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, key + extension))
+                    except FileNotFoundError:
+                        pass
+                count -= 1
+                total -= size
+                evicted += 1
+            return evicted
+
+
+_cache = None
+
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+
+def _iter_body(response: requests.Response, chunk_size: int):
+    # read1 (urllib3 >= 2) returns whatever has arrived, so the deadline is
+    # checked while a slow server trickles data; iter_content waits for
+    # full chunks.
+    read1 = getattr(response.raw, "read1", None)
+    if read1 is None:
+        yield from response.iter_content(chunk_size=chunk_size)
+        return
+    while True:
+        chunk = read1(chunk_size, decode_content=True)
+        if not chunk:
+            return
+        yield chunk
+
+
+def fetch(url: str, timeout: float = FETCH_TIMEOUT, max_bytes: int = FETCH_MAX_BYTES,
+          cache: Optional[ResponseCache] = None) -> FetchResult:
+    """
+    Fetches a URL through the shared session and the response cache. The
+    body is streamed and cut off after max_bytes, or once reading it has
+    taken longer than timeout (which also applies to connecting and to
+    each read). Bodies cut off by the timeout are not cached. Raises
+    requests exceptions on failure.
+    """
+    cache = cache or get_response_cache()
+    cached = cache.get(url)
+    if cached and cache.is_fresh(cached):
+        return cached
+
+    headers: Dict[str, str] = {}
+    if cached and cached.etag:
+        headers["If-None-Match"] = cached.etag
+    if cached and cached.last_modified:
+        headers["If-Modified-Since"] = cached.last_modified
+
+    deadline = time.monotonic() + timeout
+    with get_http_session().get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 304 and cached:
+            cached.fetched_at = time.time()
+            cache.put(cached)
+            return cached
+        response.raise_for_status()
+
+        chunks, size, truncated, timed_out = [], 0, False, False
+        for chunk in _iter_body(response, 64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                truncated = True
+                break
+            if time.monotonic() > deadline:
+                truncated = timed_out = True
+                break
+
+        result = FetchResult(
+            url=url,
+            status=response.status_code,
+            content=b"".join(chunks)[:max_bytes],
+            content_type=response.headers.get("Content-Type", ""),
+            # Only trust an explicit charset; requests guesses ISO-8859-1 otherwise.
+            encoding=response.encoding if "charset" in response.headers.get("Content-Type", "") else None,
+            truncated=truncated,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            fetched_at=time.time(),
+        )
+    # A body cut off by the deadline depends on how slow the server was; it
+    # is not cached, or a 304 would keep serving it as the full page.
+    if not timed_out:
+        cache.put(result)
+    return result
+
+
+def extract_main_text(html: Union[str, bytes], encoding: Optional[str] = None) -> str:
+    """
+    Extracts the readable main text of an HTML page: the <main> or
+    <article> element if there is one, else the body, without scripts,
+    navigation and other boilerplate. For bytes without a known encoding,
+    BeautifulSoup detects it (e.g. from a <meta charset>).
+    """
+    soup = BeautifulSoup(html, "html.parser", from_encoding=encoding if isinstance(html, bytes) else None)
+    for element in soup(BOILERPLATE_TAGS):
+        element.decompose()
+    root = soup.find("main") or soup.find(attrs={"role": "main"}) or soup.find("article") or soup.body or soup
+    lines = (re.sub(r"\s+", " ", line).strip() for line in root.get_text("\n").splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def truncate_to_tokens(text: str, token_budget: int) -> str:
+    """Cuts text down to about token_budget (estimated) tokens at a word boundary."""
+    if estimate_tokens(text) <= token_budget:
+        return text
+    cut = text[:token_budget * 4]
+    cut = cut[:cut.rfind(" ")] if " " in cut else cut
+    return cut.rstrip() + "\n[... content truncated]"
@@ -1,6 +1,8 @@
-from langchain_community.document_loaders import WebBaseLoader
 from langchain_core.tools import tool
 
+from config.settings import URL_PARSER_TOKEN_BUDGET
+from tools.fetcher import extract_main_text, fetch, truncate_to_tokens
+
 @tool
 def url_parser_tool(url: str) -> str:
     """
@@ -8,9 +10,13 @@ def url_parser_tool(url: str) -> str:
     Use this tool when a user provides a URL and asks you to analyze or summarize its content.
     """
     try:
-        loader = WebBaseLoader(url)
-        docs = loader.load()
-        content = " ".join([doc.page_content for doc in docs])
+        result = fetch(url)
+        if "html" in result.content_type or not result.content_type:
+            content = extract_main_text(result.content, result.encoding)
+        else:
+            content = result.text
+        # Only the start of long pages is handed to the agent.
+        content = truncate_to_tokens(content, URL_PARSER_TOKEN_BUDGET)
         return f"Successfully scraped content from {url}:\n\n{content}"
     except Exception as e:
         return f"Error scraping URL {url}: {e}. Please ensure the URL is valid and accessible."
@@ -1,19 +1,165 @@
-from langchain_community.tools.tavily_search import TavilySearchResults
-from config.settings import TAVILY_API_KEY
-import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.tools import tool
+
+from config.settings import (TAVILY_API_KEY, WEB_SEARCH_BURST, WEB_SEARCH_CACHE_MAX_ENTRIES,
+                             WEB_SEARCH_CACHE_TTL, WEB_SEARCH_MAX_RESULTS, WEB_SEARCH_RATE)
+
+SearchResults = List[Dict[str, str]]
+
+
+class SearchProvider(ABC):
+    """A web search backend. Returns results as {"url", "content"} dicts."""
+
+    @abstractmethod
+    def search(self, query: str, max_results: int) -> SearchResults:
+        ...
+
+
+class TavilyProvider(SearchProvider):
+    def __init__(self, api_key: str = TAVILY_API_KEY):
+        from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+        self.api_wrapper = TavilySearchAPIWrapper(tavily_api_key=api_key)
+
+    def search(self, query: str, max_results: int) -> SearchResults:
+        raw_results = self.api_wrapper.raw_results(query, max_results=max_results)
+        return self.api_wrapper.clean_results(raw_results["results"])
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, in bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive, got {rate}")
+        if capacity < 1:
+            raise ValueError(f"Capacity must be at least 1, got {capacity}")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a call is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive cache key for a query."""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+class CachedWebSearch:
+    """
+    Web search shared by all agents of the process. Results are cached per
+    normalized query for `ttl` seconds (least recently used entries are
+    evicted beyond `max_entries`), concurrent identical queries share a
+    single provider call, and provider calls go through a rate limiter.
+    """
+
+    def __init__(self, provider: SearchProvider, max_results: int = WEB_SEARCH_MAX_RESULTS,
+                 ttl: float = WEB_SEARCH_CACHE_TTL, max_entries: int = WEB_SEARCH_CACHE_MAX_ENTRIES,
+                 rate_limiter: Optional[TokenBucket] = None):
+        self.provider = provider
+        self.max_results = max_results
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.rate_limiter = rate_limiter or TokenBucket(WEB_SEARCH_RATE, WEB_SEARCH_BURST)
+        self._cache: "OrderedDict[str, Tuple[float, SearchResults]]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def search(self, query: str) -> SearchResults:
+        key = normalize_query(query)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and time.monotonic() - cached[0] < self.ttl:
+                self._cache.move_to_end(key)
+                return cached[1]
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            self.rate_limiter.acquire()
+            results = self.provider.search(query, self.max_results)
+        except Exception as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            self._cache[key] = (time.monotonic(), results)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        future.set_result(results)
+        return results
+
+
+_web_search: Optional[CachedWebSearch] = None
+_web_search_lock = threading.Lock()
+
+
+def get_web_search(provider: Optional[SearchProvider] = None) -> CachedWebSearch:
+    """
+    Returns the process-wide web search, creating it with `provider` (Tavily
+    by default). Passing a different provider replaces it, cache included.
+    """
+    global _web_search
+    with _web_search_lock:
+        if _web_search is None or (provider is not None and provider is not _web_search.provider):
+            _web_search = CachedWebSearch(provider or TavilyProvider())
+        return _web_search
+
+
+@tool("tavily_search")
+def web_search_tool(query: str):
+    """
+    A search engine optimized for comprehensive, accurate, and trusted results.
+    Useful for when you need to answer questions about current events.
+    Input should be a search query.
+    """
+    try:
+        return get_web_search().search(query)
+    except Exception as e:
+        print(f"Error during web search: {e}")
+        return f"Error searching the web: {e}"
+
 
 def get_web_search_tool():
     """
-    Initializes and returns the Tavily web search tool.
+    Returns the web search tool, backed by the shared cached search.
     Returns None if the API key is not configured.
     """
     if not TAVILY_API_KEY:
         return None
 
     try:
-        os.environ["TAVILY_API_KEY"] = TAVILY_API_KEY
-        web_search = TavilySearchResults()
-        return web_search
+        get_web_search()
+        return web_search_tool
     except Exception as e:
         print(f"Error initializing web search tool: {e}")
         return None
@@ -0,0 +1,81 @@
+import json
+from functools import lru_cache
+from typing import Any, Dict, List
+
+from langchain.schema import Document
+from langchain.text_splitter import (RecursiveCharacterTextSplitter,
+                                     SentenceTransformersTokenTextSplitter,
+                                     TextSplitter)
+
+from config.settings import (CHUNK_OVERLAP, CHUNK_SIZE, CHUNKING_POLICY,
+                             EMBEDDING_MODEL_NAME)
+
+
+def get_chunking_policy(ext: str) -> Dict[str, Any]:
+    """
+    Returns the splitter settings for a file extension, with the global
+    defaults filled in.
+    """
+    policy = {"splitter": "recursive", "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+    policy.update(CHUNKING_POLICY.get(ext, {}))
+    return policy
+
+
+def chunking_fingerprint() -> str:
+    """
+    A stable description of every chunking policy. Ingested chunks are only
+    valid for the fingerprint they were produced with.
+    """
+    policies = {ext: get_chunking_policy(ext) for ext in sorted(CHUNKING_POLICY)}
+    policies["default"] = get_chunking_policy(None)
+    return json.dumps(policies, sort_keys=True)
+
+
+@lru_cache(maxsize=None)
+def _get_splitter(ext: str) -> TextSplitter:
+    policy = get_chunking_policy(ext)
+    if policy["splitter"] == "tokens":
+        # Counts tokens with the embedding model's own tokenizer, so chunks
+        # never exceed its input window.
+        return SentenceTransformersTokenTextSplitter(
+            model_name=EMBEDDING_MODEL_NAME,
+            tokens_per_chunk=policy["chunk_size"],
+            chunk_overlap=policy["chunk_overlap"],
+        )
+    if policy["splitter"] == "recursive":
+        kwargs = {"separators": policy["separators"]} if "separators" in policy else {}
+        return RecursiveCharacterTextSplitter(
+            chunk_size=policy["chunk_size"],
+            chunk_overlap=policy["chunk_overlap"],
+            **kwargs,
+        )
+    raise ValueError(f"Unknown splitter '{policy['splitter']}' for extension {ext}")
+
+
+def chunk_documents(documents: List[Document], ext: str) -> List[Document]:
+    """
+    Splits loaded documents into chunks using the policy for their file
+    extension. Each chunk keeps its document's metadata and records its
+    position: chunk_index, start_index and end_index (character offsets
+    into the source document).
+    """
+    splitter = _get_splitter(ext)
+    chunks = []
+    for document in documents:
+        text = document.page_content
+        cursor = 0
+        for i, chunk_text in enumerate(splitter.split_text(text)):
+            start = text.find(chunk_text, cursor)
+            if start == -1:
+                # Token splitters may normalize whitespace; fall back to the cursor.
+                start = cursor
+            else:
+                cursor = start + 1
+            metadata = dict(document.metadata)
+            metadata.update({
+                "chunk_index": i,
+                "start_index": start,
+                "end_index": start + len(chunk_text),
+            })
+            chunks.append(Document(page_content=chunk_text, metadata=metadata))
+    return chunks
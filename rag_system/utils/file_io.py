@@ -1,9 +1,13 @@
 import os
-from typing import List, Dict, Callable
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+from typing import List, Dict, Callable, Iterable, Iterator, Tuple
 
 from langchain_community.document_loaders import TextLoader, CSVLoader, Docx2txtLoader
 from langchain.schema import Document
 
+from config.settings import LOADER_MAX_WORKERS, LOADER_USE_PROCESSES
+
 # Mapping file extensions to their LangChain loader classes
 LOADER_MAPPING: Dict[str, Callable] = {
     ".txt": TextLoader,
@@ -11,26 +15,103 @@ LOADER_MAPPING: Dict[str, Callable] = {
     ".docx": Docx2txtLoader,
 }
 
-def load_documents_from_directories(dir_paths: List[str]) -> List[Document]:
+def get_file_extension(filepath: str):
+    """Returns the extension of a file (e.g. '.txt'), or None if it has none."""
+    filename = os.path.basename(filepath)
+    return "." + filename.rsplit(".", 1)[-1] if '.' in filename else None
+
+def list_corpus_files(dir_paths: List[str]) -> List[str]:
     """
-    Loads documents from a list of directories, supporting multiple file types.
+    Recursively lists the loadable files in a list of directories, in a
+    stable order. Paths that point at a single file are included as-is.
     """
-    documents = []
+    filepaths = []
     for dir_path in dir_paths:
+        if os.path.isfile(dir_path):
+            if get_file_extension(dir_path) in LOADER_MAPPING:
+                filepaths.append(dir_path)
+            continue
+
         if not os.path.exists(dir_path):
             print(f"Directory not found: {dir_path}")
             continue
-            
-        for filename in os.listdir(dir_path):
-            filepath = os.path.join(dir_path, filename)
-            ext = "." + filename.rsplit(".", 1)[-1] if '.' in filename else None
-            
-            if ext in LOADER_MAPPING:
+
+        for root, dirnames, filenames in os.walk(dir_path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if get_file_extension(filename) in LOADER_MAPPING:
+                    filepaths.append(os.path.join(root, filename))
+
+    return filepaths
+
+def load_file(filepath: str) -> List[Document]:
+    """
+    Loads a single file with the loader registered for its extension.
+    """
+    loader_class = LOADER_MAPPING[get_file_extension(filepath)]
+    loader = loader_class(filepath)
+    return loader.load()
+
+def iter_load_files(
+    filepaths: Iterable[str],
+    loader: Callable[[str], List[Document]] = load_file,
+    max_workers: int = LOADER_MAX_WORKERS,
+    use_processes: bool = LOADER_USE_PROCESSES,
+) -> Iterator[Tuple[str, List[Document]]]:
+    """
+    Loads files in a worker pool and yields (filepath, documents) as each
+    one finishes, in completion order. At most two files per worker are in
+    flight at any time, so memory stays bounded however many files there
+    are. Files that fail to load are reported and skipped.
+
+    A process pool sidesteps the GIL for CPU-bound parsing (docx, CSV); the
+    loader must then be a module-level function so it can be pickled.
+    """
+    filepaths = iter(filepaths)
+
+    if max_workers <= 1:
+        for filepath in filepaths:
+            try:
+                yield filepath, loader(filepath)
+            except Exception as e:
+                print(f"Error loading file {filepath}: {e}")
+        return
+
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=max_workers) as executor:
+        pending = {}
+
+        def submit_next() -> bool:
+            filepath = next(filepaths, None)
+            if filepath is None:
+                return False
+            pending[executor.submit(loader, filepath)] = filepath
+            return True
+
+        while len(pending) < max_workers * 2 and submit_next():
+            pass
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                filepath = pending.pop(future)
+                submit_next()
                 try:
-                    loader_class = LOADER_MAPPING[ext]
-                    loader = loader_class(filepath)
-                    documents.extend(loader.load())
+                    documents = future.result()
                 except Exception as e:
                     print(f"Error loading file {filepath}: {e}")
+                    continue
+                yield filepath, documents
 
-    return documents
+def iter_documents_from_directories(dir_paths: List[str]) -> Iterator[Document]:
+    """
+    Lazily loads the documents under a list of directories, in parallel.
+    """
+    for _, documents in iter_load_files(list_corpus_files(dir_paths)):
+        yield from documents
+
+def load_documents_from_directories(dir_paths: List[str]) -> List[Document]:
+    """
+    Loads documents from a list of directories, supporting multiple file types.
+    """
+    return list(iter_documents_from_directories(dir_paths))
@@ -0,0 +1,134 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, List, Optional
+
+from config.settings import (INTERACTION_LOG_BACKUPS, INTERACTION_LOG_MAX_BYTES,
+                             INTERACTION_LOG_PATH)
+
+LOGGER_NAME = "rag.interactions"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, event and the record's fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def setup_interaction_logging(log_path: str = INTERACTION_LOG_PATH) -> logging.Logger:
+    """
+    Sets up the shared interaction logger (once per process). Records are
+    put on an in-memory queue and written to a rotating JSON-lines file by
+    a background thread, so logging never waits on disk I/O.
+    """
+    global _listener
+    logger = logging.getLogger(LOGGER_NAME)
+    with _setup_lock:
+        if _listener is not None:
+            return logger
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=INTERACTION_LOG_MAX_BYTES, backupCount=INTERACTION_LOG_BACKUPS, encoding="utf-8"
+        )
+        file_handler.setFormatter(JsonLinesFormatter())
+
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, file_handler)
+        _listener.start()
+        # Flush queued records on interpreter exit.
+        atexit.register(shutdown_interaction_logging)
+        return logger
+
+
+def shutdown_interaction_logging():
+    """Writes out the queued records and stops the background writer."""
+    global _listener
+    with _setup_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        logger = logging.getLogger(LOGGER_NAME)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        _listener = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def log_event(event: str, **fields: Any):
+    """Logs a structured event; a no-op until setup_interaction_logging is called."""
+    logging.getLogger(LOGGER_NAME).info(event, extra={"fields": fields})
+
+
+def source_ids(documents: List[Any]) -> List[str]:
+    """Chunk ids (or source paths) of retrieved documents."""
+    return [
+        document.metadata.get("chunk_id") or document.metadata.get("source", "unknown")
+        for document in documents
+    ]
+
+
+def log_interaction(request_id: str, channel: str, user, question: str, done, **fields: Any):
+    """
+    Logs one answered question from a pipeline DoneEvent: who asked, what
+    was retrieved, token counts and the duration of every stage.
+    """
+    # Imported here so the CLI can log in before the LangChain stack loads.
+    from core.history import estimate_tokens
+    log_event(
+        "rag.answer",
+        request_id=request_id,
+        channel=channel,
+        user=user.username,
+        role=user.role,
+        question=question,
+        standalone_question=done.standalone_question,
+        answer=done.answer,
+        cached=done.cached,
+        sources=source_ids(done.documents),
+        tokens={
+            "question": estimate_tokens(question),
+            "history": done.history_tokens,
+            "dropped_history": done.dropped_history_tokens,
+            "context": done.context_tokens,
+            "answer": estimate_tokens(done.answer) if done.answer else 0,
+        },
+        durations_ms={stage: round(seconds * 1000, 2) for stage, seconds in done.timings.items()},
+        **fields,
+    )
+
+
+class Timer:
+    """Measures a block in milliseconds: `with Timer() as t: ...; t.ms`."""
+
+    def __enter__(self) -> "Timer":
+        self._start = time.perf_counter()
+        self.ms = 0.0
+        return self
+
+    def __exit__(self, *exc_info):
+        self.ms = round((time.perf_counter() - self._start) * 1000, 2)
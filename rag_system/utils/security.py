@@ -1,3 +1,9 @@
+import base64
+import hashlib
+import hmac
+import json
+from typing import Optional
+
 import bcrypt
 
 def hash_password(password: str) -> str:
@@ -9,3 +15,20 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a plain password against a hashed password."""
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+def sign_token(payload: dict, secret: str) -> str:
+    """Encodes a JSON payload as a URL-safe token signed with HMAC-SHA256."""
+    body = base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode('utf-8')).decode('ascii')
+    signature = hmac.new(secret.encode('utf-8'), body.encode('ascii'), hashlib.sha256).hexdigest()
+    return f"{body}.{signature}"
+
+def verify_token(token: str, secret: str) -> Optional[dict]:
+    """Returns the payload of a token if its signature is valid, otherwise None."""
+    try:
+        body, signature = token.rsplit(".", 1)
+        expected = hmac.new(secret.encode('utf-8'), body.encode('ascii'), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(signature, expected):
+            return None
+        return json.loads(base64.urlsafe_b64decode(body.encode('ascii')))
+    except (ValueError, UnicodeError):
+        return None